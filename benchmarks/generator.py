@@ -0,0 +1,125 @@
+"""Generates synthetic input files in the same text format as the hand written ones"""
+
+from dataclasses import dataclass
+import math
+import random
+from typing import Dict, List, Tuple
+
+# Course numbers whose lectures add the 851 / 913 tutorials, which need a TU 18:00 tutorial slot
+_SKIPPED_COURSES = {351, 413}
+
+_LEC_TIMES = {
+    "MO": [f"{hour}:00" for hour in range(8, 21)],
+    # TU 11:00 lecture slots are removed by the search
+    "TU": ["8:00", "9:30", "12:30", "14:00", "15:30", "17:00", "18:30"],
+}
+_TUT_TIMES = {
+    "MO": [f"{hour}:00" for hour in range(8, 21)],
+    "TU": [f"{hour}:00" for hour in range(8, 21)],
+    "FR": [f"{hour}:00" for hour in range(8, 20, 2)],
+}
+
+
+@dataclass(frozen=True, slots=True)
+class InstanceSpec:
+    num_lectures: int
+    tutorials_per_lecture: int
+    num_lec_slots: int
+    num_tut_slots: int
+    # Entries per lecture / tutorial of each constraint type
+    not_compatible_density: float = 0.1
+    pair_density: float = 0.05
+    preference_density: float = 0.2
+    unwanted_density: float = 0.05
+    # 5XX lectures must not overlap each other, so there can be at most one per lecture slot
+    grad_lecture_fraction: float = 0.1
+    seed: int = 433
+
+
+def _pick_slots(
+    rng: random.Random, times: Dict[str, List[str]], num_slots: int
+) -> List[Tuple[str, str]]:
+    slots = [(day, time) for day, day_times in times.items() for time in day_times]
+    if num_slots > len(slots):
+        raise ValueError(f"At most {len(slots)} slots of this type are available.")
+    return sorted(rng.sample(slots, num_slots))
+
+
+def generate_instance(spec: InstanceSpec) -> List[str]:
+    """Generates the lines of an input file. The same spec always gives the same lines"""
+    rng = random.Random(spec.seed)
+
+    courses = [course for course in range(200, 500) if course not in _SKIPPED_COURSES]
+    grad_courses = list(range(500, 600))
+    if spec.num_lectures > (len(courses) + len(grad_courses)) * 89:
+        raise ValueError("Too many lectures.")
+    lectures: List[str] = []
+    sections: Dict[int, int] = {}
+    while len(lectures) < spec.num_lectures:
+        if rng.random() < spec.grad_lecture_fraction:
+            course = rng.choice(grad_courses)
+        else:
+            course = rng.choice(courses)
+        # Sections starting with 9 are evening lectures, which only fit a few slots
+        section = sections.get(course, 0) + 1
+        if section > 89:
+            continue
+        sections[course] = section
+        lectures.append(f"CPSC {course} LEC {section:02}")
+    tutorials = [
+        f"{lec} TUT {tut:02}"
+        for lec in lectures
+        for tut in range(1, spec.tutorials_per_lecture + 1)
+    ]
+    items = lectures + tutorials
+    lecture_set = set(lectures)
+
+    lec_slots = _pick_slots(rng, _LEC_TIMES, spec.num_lec_slots)
+    tut_slots = _pick_slots(rng, _TUT_TIMES, spec.num_tut_slots)
+
+    def slot_lines(slots: List[Tuple[str, str]], num_items: int) -> List[str]:
+        # Leave room to spare so that most instances have a valid schedule
+        max_cap = math.ceil(1.5 * num_items / max(len(slots), 1)) + 1
+        lines = []
+        for day, time in slots:
+            min_cap = rng.randint(0, max_cap // 3)
+            alt_max = rng.randint(0, max_cap)
+            lines.append(f"{day}, {time}, {max_cap}, {min_cap}, {alt_max}")
+        return lines
+
+    def num_entries(density: float) -> int:
+        return round(density * len(items))
+
+    lines = ["Name:", f"synthetic-{spec.seed}", "", "Lecture slots:"]
+    lines += slot_lines(lec_slots, len(lectures))
+    lines += ["", "Tutorial slots:"]
+    lines += slot_lines(tut_slots, len(tutorials))
+    lines += ["", "Lectures:"]
+    lines += [f"{lec}, {'true' if rng.random() < 0.1 else 'false'}" for lec in lectures]
+    lines += ["", "Tutorials:"]
+    lines += [f"{tut}, false" for tut in tutorials]
+
+    lines += ["", "Not compatible:"]
+    for _ in range(num_entries(spec.not_compatible_density)):
+        id1, id2 = rng.sample(items, 2)
+        lines.append(f"{id1}, {id2}")
+
+    lines += ["", "Unwanted:"]
+    for _ in range(num_entries(spec.unwanted_density)):
+        ident = rng.choice(items)
+        day, time = rng.choice(lec_slots if ident in lecture_set else tut_slots)
+        lines.append(f"{ident}, {day}, {time}")
+
+    lines += ["", "Preferences:"]
+    for _ in range(num_entries(spec.preference_density)):
+        ident = rng.choice(items)
+        day, time = rng.choice(lec_slots if ident in lecture_set else tut_slots)
+        lines.append(f"{day}, {time}, {ident}, {rng.randint(1, 10)}")
+
+    lines += ["", "Pair:"]
+    for _ in range(num_entries(spec.pair_density)):
+        id1, id2 = rng.sample(items, 2)
+        lines.append(f"{id1}, {id2}")
+
+    lines += ["", "Partial assignments:", ""]
+    return lines
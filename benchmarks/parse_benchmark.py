@@ -0,0 +1,41 @@
+"""Times parsing a large synthetic input file
+
+python -m benchmarks.parse_benchmark --lectures 20000
+"""
+
+import argparse
+import time
+
+from benchmarks.generator import InstanceSpec, generate_instance
+from project.parser import get_input_data
+
+
+def main():
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.parse_benchmark")
+    parser.add_argument("--lectures", type=int, default=20000)
+    parser.add_argument("--tutorials-per-lecture", type=int, default=3)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    lines = generate_instance(
+        InstanceSpec(
+            num_lectures=args.lectures,
+            tutorials_per_lecture=args.tutorials_per_lecture,
+            num_lec_slots=20,
+            num_tut_slots=30,
+        )
+    )
+    times = []
+    for _ in range(args.repeat):
+        start = time.perf_counter()
+        get_input_data(lines, "1", "1", "1", "1", "1", "1", "1", "1")
+        times.append(time.perf_counter() - start)
+
+    print(
+        f"{len(lines)} lines | best {min(times):.3f}s"
+        f" | {len(lines) / min(times):.0f} lines/s"
+    )
+
+
+if __name__ == "__main__":
+    main()
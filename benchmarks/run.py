@@ -0,0 +1,123 @@
+"""Runs AndTreeSearch on generated instances of growing size and writes the timings as JSON
+
+python -m benchmarks.run --output results.json --time-limit 10
+"""
+
+import argparse
+from dataclasses import asdict, replace
+import json
+import time
+from typing import Any, Dict, List, Optional
+
+from benchmarks.generator import InstanceSpec, generate_instance
+from project.and_tree import AndTreeSearch
+from project.parser import get_input_data
+
+SCALES: Dict[str, InstanceSpec] = {
+    "small": InstanceSpec(
+        num_lectures=6, tutorials_per_lecture=1, num_lec_slots=5, num_tut_slots=5
+    ),
+    "medium": InstanceSpec(
+        num_lectures=20, tutorials_per_lecture=2, num_lec_slots=12, num_tut_slots=16
+    ),
+    "large": InstanceSpec(
+        num_lectures=60, tutorials_per_lecture=2, num_lec_slots=20, num_tut_slots=30
+    ),
+    "department": InstanceSpec(
+        num_lectures=200, tutorials_per_lecture=3, num_lec_slots=20, num_tut_slots=30
+    ),
+}
+
+
+def run_benchmark(
+    spec: InstanceSpec, time_limit: float, search_options: Dict[str, Any]
+) -> Dict[str, Any]:
+    """Solves one generated instance and measures the parse time, nodes per second, time to the
+    first valid schedule, time to the optimal one and time until the search proved it optimal
+    (both None if the time limit ran out first)"""
+    lines = generate_instance(spec)
+
+    start = time.perf_counter()
+    input_data = get_input_data(lines, "1", "1", "1", "1", "1", "1", "1", "1")
+    parse_seconds = time.perf_counter() - start
+
+    solutions: List[Dict[str, float]] = []
+    start = time.perf_counter()
+
+    def on_solution(ev, _):
+        solutions.append({"seconds": time.perf_counter() - start, "eval": ev})
+
+    search = AndTreeSearch(
+        input_data,
+        time_limit=time_limit,
+        on_solution=on_solution,
+        **search_options,
+    )
+    search.search()
+    elapsed = time.perf_counter() - start
+
+    # The last schedule found is only known to be optimal once the search went through the tree
+    optimal_seconds: Optional[float] = None
+    proof_seconds: Optional[float] = None
+    if search.finished:
+        proof_seconds = elapsed
+        if solutions:
+            optimal_seconds = solutions[-1]["seconds"]
+    return {
+        "spec": asdict(spec),
+        "parse_seconds": parse_seconds,
+        "num_nodes": search.num_nodes,
+        "nodes_per_second": search.num_nodes / elapsed if elapsed > 0 else 0.0,
+        "first_solution_seconds": solutions[0]["seconds"] if solutions else None,
+        "first_eval": solutions[0]["eval"] if solutions else None,
+        "best_eval": solutions[-1]["eval"] if solutions else None,
+        "optimal_seconds": optimal_seconds,
+        "proof_seconds": proof_seconds,
+        "solutions": solutions,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.run")
+    parser.add_argument(
+        "--scale", nargs="+", choices=SCALES, default=["small", "medium", "large"]
+    )
+    parser.add_argument("--seeds", type=int, nargs="+", default=[433])
+    parser.add_argument(
+        "--time-limit",
+        type=float,
+        default=10,
+        help="Seconds each instance is searched for",
+    )
+    parser.add_argument("--output", default="benchmark.json")
+    parser.add_argument("--dynamic-order", action="store_true")
+    parser.add_argument("--backjump", action="store_true")
+    parser.add_argument("--break-symmetry", action="store_true")
+    args = parser.parse_args()
+
+    search_options = {
+        "dynamic_order": args.dynamic_order,
+        "backjump": args.backjump,
+        "break_symmetry": args.break_symmetry,
+    }
+    results = []
+    for scale in args.scale:
+        for seed in args.seeds:
+            spec = replace(SCALES[scale], seed=seed)
+            result = run_benchmark(spec, args.time_limit, search_options)
+            result["scale"] = scale
+            results.append(result)
+            print(
+                f"{scale} (seed {seed}): {result['num_nodes']} nodes"
+                f" ({result['nodes_per_second']:.0f}/s)"
+                f" | first {result['first_solution_seconds']}"
+                f" | optimal {result['optimal_seconds']}"
+                f" | proven {result['proof_seconds']}"
+            )
+
+    with open(args.output, "w") as f:
+        json.dump({"search_options": search_options, "results": results}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,23 +1,49 @@
 from __future__ import annotations
 from collections import OrderedDict, defaultdict
-from dataclasses import dataclass, field
-import random
-from typing import Dict, List, Mapping, Optional
+from dataclasses import dataclass
+import heapq
+from itertools import chain
+import multiprocessing
+from multiprocessing.sharedctypes import Synchronized
+import time
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    FrozenSet,
+    Iterable,
+    Iterator,
+    List,
+    Mapping,
+    Optional,
+    Sequence,
+    Set,
+    Tuple,
+    Union,
+)
 from project.models import (
     LecTut,
-    LectureSlot,
-    NotCompatible,
-    PartialAssignment,
-    Tutorial,
     LecTutSlot,
     is_tut,
     is_lec,
 )
 from project.parser import InputData
+from project.local_search import LocalSearch
+from project.problem import LEVEL_5XX, Problem, compile_problem
+
+
+# Number of subproblems handed to each worker of a parallel search
+SUBPROBLEMS_PER_WORKER = 4
 
+# (item, slot, bounding score contribution) of scheduling a lecture / tutorial
+Expansion = Tuple[int, int, float]
+
+# (item, slot) assignments that together make every complete schedule fail the hard constraints
+Nogood = FrozenSet[Tuple[int, int]]
+
+# (bounding score contribution, slot) of the slots of a lecture / tutorial
+SlotCost = Tuple[float, int]
 
-EVENING_TIME = 18
-LEVEL_5XX = 5
 
 @dataclass(frozen=True, slots=True)
 class ScheduledItem:
@@ -27,47 +53,6 @@ class ScheduledItem:
     b_score_contribution: float
 
 
-@dataclass
-class DummyLecTut(LecTut):
-    identifier: str = "DMM 123 LEC 01"
-    alrequired: bool = False
-
-
-@dataclass(frozen=True)
-class DummyScheduledItem(ScheduledItem):
-    lt: LecTut = field(default_factory=DummyLecTut)
-    start_time: float = 0.0
-    end_time: float = 0.0
-    day: str = ""
-    slot: Optional[LecTutSlot] = None
-    cap_at_assign: int = 0
-    b_score_contribution: float = 0
-
-
-@dataclass(frozen=True, slots=True)
-class Node:
-    most_recent_item: ScheduledItem = field(default_factory=DummyScheduledItem)
-
-
-def _day_overlap(lt1: LecTut, day1: str, lt2: LecTut, day2: str) -> bool:
-    """Returns True if the scheduling of two lectures day's overlap"""
-    if day1 == day2:
-        return True
-
-    # Check if MWF lecture clashes with F tutorial
-    if is_lec(lt1) and day1 == "MO" and is_tut(lt2) and day2 == "FR":
-        return True
-    if is_tut(lt1) and day1 == "FR" and is_lec(lt2) and day2 == "MO":
-        return True
-
-    return False
-
-
-def _overlap(start1: float, end1: float, start2: float, end2: float) -> bool:
-    """Return True if two times overlap"""
-    return not ((end1 <= start2) or (end2 <= start1))
-
-
 def _get_formatted_schedule(sched: Mapping[str, ScheduledItem]) -> str:
     """Creates a formatted output of the schedule"""
 
@@ -108,204 +93,655 @@ def _get_formatted_schedule(sched: Mapping[str, ScheduledItem]) -> str:
     return "\n".join(lines)
 
 
+@dataclass(slots=True)
+class _Level:
+    """A node on the stack of the backjumping search"""
+
+    expansions: Iterator[Expansion]
+    item: int
+    expanded: Set[int]
+    # Depths of the assignments on the trail that made the tried expansions fail, None if an
+    # expansion failed for another reason (bound, complete schedule)
+    conflict: Optional[Set[int]]
+
+
+@dataclass(frozen=True, slots=True)
+class SearchProgress:
+    depth: int
+    num_nodes: int
+    nodes_per_second: float
+    best_eval: float
+    elapsed: float
+
+
+# Called with the eval score and schedule of every improving schedule found by the search
+SolutionCallback = Callable[[float, Dict[str, ScheduledItem]], None]
+
+# Called with the state of a running search at most once per progress interval
+ProgressCallback = Callable[[SearchProgress], None]
+
+
 class AndTreeSearch:
+    """One search over a compiled problem. All state that changes during the search (capacities,
+    schedule, bounds) lives here, so several searches can share one problem, one after the other
+    or at the same time"""
 
     def __init__(
-        self, input_data: InputData, break_limit: Optional[int] = None, shuffle=False
+        self,
+        input_data: Union[InputData, Problem],
+        break_limit: Optional[int] = None,
+        shuffle=False,
+        time_limit: Optional[float] = None,
+        node_limit: Optional[int] = None,
+        on_solution: Optional[SolutionCallback] = None,
+        progress: Optional[ProgressCallback] = None,
+        progress_interval: float = 1.0,
+        dynamic_order: bool = False,
+        backjump: bool = False,
+        nogood_size: int = 0,
+        break_symmetry: bool = False,
+        warm_start: Optional[Mapping[str, Tuple[str, str]]] = None,
+        item_order: Optional[Sequence[int]] = None,
     ) -> None:
-        self._input_data = input_data
+        # A compiled problem is used as is, it was already shuffled when it was compiled
+        if isinstance(input_data, Problem):
+            self._problem = input_data
+        else:
+            self._problem = compile_problem(input_data, shuffle=shuffle)
+        problem = self._problem
 
-        if shuffle:
-            random.shuffle(self._input_data.tutorials)
-            random.shuffle(self._input_data.lectures)
+        self._curr_cap = [0] * len(problem.slots)
+        self._curr_alt_cap = [0] * len(problem.slots)
 
-        self._NUM_LEC = len(self._input_data.lectures)
-        self._NUM_TUT = len(self._input_data.tutorials)
+        # Slot of every lecture / tutorial, -1 while it is unassigned
+        self._assigned = [-1] * problem.num_items
+        self._assigned_b_score = [0.0] * problem.num_items
+        self._cap_at_assign = [0] * problem.num_items
 
-        self._open_lecture_slots = {
-            item.identifier: item for item in self._input_data.lec_slots
-        }
-        self._open_tut_slots = {
-            item.identifier: item for item in self._input_data.tut_slots
-        }
+        # Lectures / tutorials scheduled by the search on top of the partial assignments, in order
+        self._trail: List[int] = []
 
-        self._successors: Dict[str, LecTut] = {}
+        self._curr_bounding_score = 0
 
-        self._curr_schedule: Dict[str, ScheduledItem] = {}
+        # Number of scheduled lectures per (course, day and start time), used for the section penalty
+        self._section_counts = [0] * (problem.num_courses * problem.num_day_starts)
 
-        self._curr_bounding_score = 0
+        # Time cells covered by the scheduled 5XX lectures, see Problem.slot_5XX_cells
+        self._5XX_cells = 0
 
         self._min_eval = float("inf")
 
+        # Best eval score found by any worker of a parallel search
+        self._shared_min_eval: Optional[Synchronized] = None
+
         self.ans: Optional[Dict[str, ScheduledItem]] = None
 
         self._break_limit = break_limit
 
         self._num_results = 0
 
+        # Anytime budget: the search stops and keeps its best schedule once either is exhausted
+        self._time_limit = time_limit
+        self._deadline: Optional[float] = None
+        self._node_limit = node_limit
+        self._num_nodes = 0
+
+        self._on_solution = on_solution
+
+        self._progress = progress
+        self._progress_interval = progress_interval
+        self._start_time = 0.0
+        self._last_progress = 0.0
+
+        self._cancelled = False
+
+        # Set once the search stops early (cancel, results, nodes or time), see finished
+        self._stopped = False
+        self._finished = False
+
+        # Branch on the lecture / tutorial with the fewest feasible slots left instead of _build_order
+        self._dynamic_order = dynamic_order
+
+        # Jump back to the most recent assignment that caused a dead end instead of the last one,
+        # and remember the causes with at most `nogood_size` assignments
+        self._backjump = backjump
+        self._nogood_size = nogood_size
+        self._nogoods: Dict[Tuple[int, int], List[Nogood]] = defaultdict(list)
+
+        # Only explore one of the schedules that differ by swapping interchangeable tutorials
+        self._break_symmetry = break_symmetry
+
+        # Order in which _build_order considers the lectures / tutorials, so a search can be
+        # reordered without compiling the problem again. By default their index order
+        self._item_order = item_order if item_order is not None else range(problem.num_items)
+
         self._init_schedule()
 
-        assert self._NUM_LEC >= len(self._5XX_lectures) + len(
-            self._al_required_lectures
-        ) + len(self._other_lectures) + len(self._evening_lectures)
-        assert self._NUM_TUT >= len(self._tutorials)
+        # Slot of every lecture / tutorial in a previous schedule, tried first by the search
+        self._prior_slots: Dict[int, int] = {}
+        if warm_start:
+            self._init_warm_start(warm_start)
+
+    def _init_warm_start(self, warm_start: Mapping[str, Tuple[str, str]]) -> None:
+        """Maps a previous schedule (day and time of every lecture / tutorial) onto the problem.
+        Lectures / tutorials and slots that no longer exist are ignored. If the schedule still
+        passes the hard constraints, it becomes the schedule the search has to beat"""
+        problem = self._problem
+        slot_index = {
+            (problem.slot_is_lec[slot], s.day, s.time): slot
+            for slot, s in enumerate(problem.slots)
+        }
+        for item, lt in enumerate(problem.items):
+            if lt.identifier not in warm_start or self._assigned[item] >= 0:
+                continue
+            day, time = warm_start[lt.identifier]
+            slot = slot_index.get((problem.item_is_lec[item], day, time))
+            if slot is not None:
+                self._prior_slots[item] = slot
 
-    def _calc_bounding_score_contrib(
-        self, next_lt: LecTut, next_slot: LecTutSlot
-    ) -> float:
-        """Calculates the bounding score change that occurs if we add a lecture or tutorial to the schedule"""
-        pref_pen = 0
+        if any(item not in self._prior_slots for item in self._order):
+            return
+
+        # Any schedule that passes the hard constraints can be the incumbent, not only the
+        # symmetry breaking one
+        break_symmetry = self._break_symmetry
+        self._break_symmetry = False
+        start_depth = len(self._trail)
+        for item in self._order:
+            slot = self._prior_slots[item]
+            if self._fail_hc(item, slot):
+                break
+            self._pre_dfs_updates(item, slot, self._calc_bounding_score_contrib(item, slot))
+        else:
+            self.ans = self._get_schedule()
+            self._min_eval = self._get_eval_score()
+            # Counts towards the break limit, so a search for the first valid schedule returns it
+            self._num_results += 1
+
+        while len(self._trail) > start_depth:
+            self._post_dfs_updates()
+        self._break_symmetry = break_symmetry
+
+    @property
+    def num_nodes(self) -> int:
+        """Number of nodes the search has visited"""
+        return self._num_nodes
+
+    @property
+    def best_eval(self) -> float:
+        """Eval score of the best schedule found so far, inf if there is none"""
+        return self._min_eval
+
+    @property
+    def finished(self) -> bool:
+        """True if the last search went through the whole tree without being stopped early, so
+        its best schedule is optimal, or there is no valid schedule"""
+        return self._finished
+
+    def _num_scheduled(self) -> int:
+        return len(self._problem.part_assign) + len(self._trail)
+
+    def _get_schedule(self) -> Dict[str, ScheduledItem]:
+        """Translates the current schedule back to the lectures / tutorials and slots"""
+        problem = self._problem
+        return {
+            problem.items[item].identifier: ScheduledItem(
+                problem.items[item],
+                problem.slots[self._assigned[item]],
+                self._cap_at_assign[item],
+                self._assigned_b_score[item],
+            )
+            for item in [item for item, _ in problem.part_assign] + self._trail
+        }
+
+    def _section_key(self, item: int, slot: int) -> int:
+        problem = self._problem
+        return (
+            problem.item_course[item] * problem.num_day_starts
+            + problem.slot_day_start[slot]
+        )
 
-        if (ident := next_lt.identifier) in self._input_data.preferences:
-            for pref in self._input_data.preferences[ident]:
-                if pref.day != next_slot.day or pref.start_time != next_slot.start_time:
-                    pref_pen += pref.pref_val
+    def _calc_bounding_score_contrib(self, item: int, slot: int) -> float:
+        """Calculates the bounding score change that occurs if we add a lecture or tutorial to the schedule"""
+        pref_pen = self._problem.item_pref_pen[item][slot]
 
-        section_pen = 0
-        if not is_lec(next_lt):
+        if not self._problem.item_is_lec[item]:
             return pref_pen
 
-        for _, item in self._curr_schedule.items():
-            if not is_lec(item.lt):
-                continue
-            if (
-                next_lt.course_id == item.lt.course_id
-                and _day_overlap(next_lt, next_slot.day, item.lt, item.slot.day)
-                and next_slot.start_time == item.slot.start_time
-            ):
-                section_pen += self._input_data.pen_section
+        section_pen = (
+            self._section_counts[self._section_key(item, slot)]
+            * self._problem.pen_section
+        )
 
         b_score = pref_pen + section_pen
         return b_score
 
     def _get_eval_score(self):
         """Gets the eval score of the current schedule"""
+        return (
+            self._curr_bounding_score
+            + self._lec_min_deficit * self._problem.pen_lec_min
+            + self._tut_min_deficit * self._problem.pen_tut_min
+            + self._pair_pen
+        )
 
-        tut_min_pen = 0
-        lec_min_pen = 0
+    def _get_lower_bound(self, item: int, slot: int, next_b_score: float) -> float:
+        """Admissible lower bound on the eval score of every complete schedule that extends the
+        current schedule with the lecture or tutorial in the given slot"""
+        problem = self._problem
+
+        # Every unassigned lecture / tutorial pays at least its cheapest preference penalty
+        pref_lb = self._unassigned_pref_lb - self._min_pref_pen[item]
+
+        # Each unassigned lecture / tutorial can lower the deficit of its slot type by one at most
+        fills_slot = self._curr_cap[slot] < problem.slot_min_cap[slot]
+        lec_deficit, num_lec = self._lec_min_deficit, self._num_unassigned_lec
+        tut_deficit, num_tut = self._tut_min_deficit, self._num_unassigned_tut
+        if problem.item_is_lec[item]:
+            lec_deficit -= fills_slot
+            num_lec -= 1
+        else:
+            tut_deficit -= fills_slot
+            num_tut -= 1
+        min_fill_lb = (
+            max(lec_deficit - num_lec, 0) * problem.pen_lec_min
+            + max(tut_deficit - num_tut, 0) * problem.pen_tut_min
+        )
 
-        for slot in self._open_lecture_slots.values():
-            lec_min_pen += (
-                max(slot.min_cap - slot.current_cap, 0) * self._input_data.pen_lec_min
-            )
+        _, pair_lb_contrib = self._calc_pair_pen_contrib(item, slot)
 
-        for slot in self._open_tut_slots.values():
-            tut_min_pen += (
-                max(slot.min_cap - slot.current_cap, 0) * self._input_data.pen_tut_min
-            )
+        return (
+            self._curr_bounding_score
+            + next_b_score
+            + pref_lb
+            + min_fill_lb
+            + self._pair_pen_lb
+            + pair_lb_contrib
+        )
 
-        pair_pen = 0
-        # Pair penality
-        for pair in self._input_data.pair:
-            item_1 = self._curr_schedule[pair.id1]
-            item_2 = self._curr_schedule[pair.id2]
-            if (
-                item_1.slot.day != item_2.slot.day
-                or item_1.slot.time != item_2.slot.time
-            ):
-                pair_pen += self._input_data.pen_not_paired
+    def _init_eval_totals(self) -> None:
+        """Computes the running penalties and lower bound terms of the initial schedule"""
+        problem = self._problem
 
-        return self._curr_bounding_score + lec_min_pen + tut_min_pen + pair_pen
+        self._lec_min_deficit = sum(
+            max(problem.slot_min_cap[slot] - self._curr_cap[slot], 0)
+            for slot in problem.lec_slots
+        )
+        self._tut_min_deficit = sum(
+            max(problem.slot_min_cap[slot] - self._curr_cap[slot], 0)
+            for slot in problem.tut_slots
+        )
 
-    def _fail_hc(
-        self,
-        curr_sched: Dict[str, ScheduledItem],
-        next_lt: LecTut,
-        next_slot: LecTutSlot,
-    ) -> bool:
-        """Check if adding the lecture/tutorial in the given slot fails hard constraints"""
+        unassigned = [
+            item for item in range(problem.num_items) if self._assigned[item] < 0
+        ]
+        self._num_unassigned_lec = sum(problem.item_is_lec[item] for item in unassigned)
+        self._num_unassigned_tut = len(unassigned) - self._num_unassigned_lec
+
+        self._min_pref_pen = [0] * problem.num_items
+        for item in range(problem.num_items):
+            slots = problem.lec_slots if problem.item_is_lec[item] else problem.tut_slots
+            if problem.item_prefs[item] and slots:
+                pref_pen = problem.item_pref_pen[item]
+                self._min_pref_pen[item] = min(pref_pen[slot] for slot in slots)
+        self._unassigned_pref_lb = sum(self._min_pref_pen[item] for item in unassigned)
+
+        self._lec_day_times = {problem.slot_day_time[slot] for slot in problem.lec_slots}
+        self._tut_day_times = {problem.slot_day_time[slot] for slot in problem.tut_slots}
+
+        self._pair_pen = 0
+        self._pair_pen_lb = 0
+        for item, slot in problem.part_assign:
+            for other in problem.item_pairs[item]:
+                other_slot = self._assigned[other]
+                if other_slot < 0:
+                    if problem.slot_day_time[slot] not in self._pair_day_times(other):
+                        self._pair_pen_lb += problem.pen_not_paired
+                # Pairs of scheduled lectures / tutorials are seen from both sides
+                elif other > item and (
+                    problem.slot_day_time[slot] != problem.slot_day_time[other_slot]
+                ):
+                    self._pair_pen += problem.pen_not_paired
+                    self._pair_pen_lb += problem.pen_not_paired
 
-        # Handle evening constraint
-        if next_lt.is_evening and next_slot.start_time < EVENING_TIME:
+    def _pair_day_times(self, item: int) -> Set[int]:
+        """Days and times of the slots a lecture or tutorial can be paired in"""
+        if self._problem.item_is_lec[item]:
+            return self._lec_day_times
+        return self._tut_day_times
+
+    def _calc_pair_pen_contrib(self, item: int, slot: int) -> Tuple[int, int]:
+        """Calculates the change in the pair penalty and in its lower bound that occurs if we add
+        a lecture or tutorial to the schedule. The lower bound also counts pairs whose unassigned
+        partner has no slot at the same day and time"""
+        problem = self._problem
+
+        pair_pen = 0
+        pair_lb = 0
+        day_time = problem.slot_day_time[slot]
+        for other in problem.item_pairs[item]:
+            other_slot = self._assigned[other]
+            if other_slot >= 0:
+                other_day_time = problem.slot_day_time[other_slot]
+                if other_day_time != day_time:
+                    pair_pen += problem.pen_not_paired
+                    pair_lb += problem.pen_not_paired
+                # The pair was already counted in the lower bound if it could never be matched
+                if other_day_time not in self._pair_day_times(item):
+                    pair_lb -= problem.pen_not_paired
+            elif day_time not in self._pair_day_times(other):
+                pair_lb += problem.pen_not_paired
+        return pair_pen, pair_lb
+
+    def _fail_hc(self, item: int, slot: int) -> bool:
+        """Check if adding the lecture/tutorial in the given slot fails hard constraints"""
+        # Handle evening constraint and unwanted SLOT ASSIGNMENTS
+        if slot not in self._problem.item_allowed[item]:
             return True
+        return self._fail_dynamic_hc(item, slot)
+
+    def _fail_dynamic_hc(self, item: int, slot: int) -> bool:
+        """Check if adding the lecture/tutorial in one of its allowed slots fails the hard
+        constraints that depend on the rest of the schedule"""
+        problem = self._problem
 
         # Handle cap limit
-        if next_slot.current_cap >= next_slot.max_cap:
+        if self._curr_cap[slot] >= problem.slot_max_cap[slot]:
             return True
 
         # Handle AL limit
-        if next_lt.alrequired and next_slot.current_alt_cap >= next_slot.alt_max:
+        if (
+            problem.item_alrequired[item]
+            and self._curr_alt_cap[slot] >= problem.slot_alt_max[slot]
+        ):
             return True
 
-        # Handle 5XX TIME OVERLAPS
-        if is_lec(next_lt) and next_lt.level == LEVEL_5XX:
-            for sched_item in self._curr_schedule.values():
-                if (
-                    is_lec(sched_item.lt)
-                    and sched_item.lt.level == LEVEL_5XX
-                    and _day_overlap(
-                        sched_item.lt, sched_item.slot.day, next_lt, next_slot.day
-                    )
-                    and _overlap(
-                        sched_item.slot.start_time,
-                        sched_item.slot.end_time,
-                        next_slot.start_time,
-                        next_slot.end_time,
-                    )
-                ):
-                    return True
+        clashes = problem.slot_clashes[slot]
 
-        # Handle tutorial and lecture TIME OVERLAPS
-        if is_tut(next_lt) and next_lt.parent_lecture_id in curr_sched:
-            sched_lecture = curr_sched[next_lt.parent_lecture_id]
-            if _day_overlap(
-                sched_lecture.lt, sched_lecture.slot.day, next_lt, next_slot.day
-            ) and _overlap(
-                sched_lecture.slot.start_time,
-                sched_lecture.slot.end_time,
-                next_slot.start_time,
-                next_slot.end_time,
+        if problem.item_is_lec[item]:
+            # Handle 5XX TIME OVERLAPS
+            if (
+                problem.item_level[item] == LEVEL_5XX
+                and self._5XX_cells & problem.slot_5XX_cells[slot]
             ):
                 return True
 
-        if is_lec(next_lt):
-            for sched_tut in curr_sched.values():
-                if (
-                    is_tut(sched_tut.lt)
-                    and sched_tut.lt.parent_lecture_id == next_lt.identifier
-                ):
-                    if _day_overlap(
-                        sched_tut.lt, sched_tut.slot.day, next_lt, next_slot.day
-                    ) and _overlap(
-                        sched_tut.slot.start_time,
-                        sched_tut.slot.end_time,
-                        next_slot.start_time,
-                        next_slot.end_time,
-                    ):
-                        return True
+            # Handle tutorial and lecture TIME OVERLAPS
+            for tut in problem.item_children[item]:
+                if self._assigned[tut] in clashes:
+                    return True
+        elif (parent := problem.item_parent[item]) >= 0:
+            if self._assigned[parent] in clashes:
+                return True
 
         # Handle not compatible TIME OVERLAPS
-        for non_c in self._input_data.not_compatible:
-            id1, id2 = non_c.id1, non_c.id2
-            if next_lt.identifier not in (id1, id2):
+        for other in problem.item_not_compatible[item]:
+            if self._assigned[other] in clashes:
+                return True
+
+        if self._break_symmetry and self._breaks_symmetry(item, slot) is not None:
+            return True
+
+        return False
+
+    def _breaks_symmetry(self, item: int, slot: int) -> Optional[int]:
+        """Interchangeable tutorials have to be put in slots in increasing order. Returns the
+        scheduled interchangeable tutorial the slot is out of order with, None if there is none"""
+        problem = self._problem
+        prev = problem.item_symmetric_prev[item]
+        if prev >= 0 and 0 <= slot < self._assigned[prev]:
+            return prev
+        nxt = problem.item_symmetric_next[item]
+        if nxt >= 0 and slot > self._assigned[nxt] >= 0:
+            return nxt
+        return None
+
+    def _culprits(self, items: Iterator[int], depths: Mapping[int, int]) -> Set[int]:
+        """Depths of the lectures / tutorials on the trail that cause a hard constraint failure.
+        Empty if any of them is a partial assignment, since the failure then always happens"""
+        culprits = set()
+        for other in items:
+            if other not in depths:
+                return set()
+            culprits.add(depths[other])
+        return culprits
+
+    def _conflict_reason(
+        self, item: int, slot: int, depths: Mapping[int, int]
+    ) -> Optional[Set[int]]:
+        """Gets the depths of the assignments on the trail that make the lecture/tutorial fail the
+        hard constraints or a nogood in the given slot. None if it passes them. Follows _fail_hc"""
+        problem = self._problem
+
+        if slot not in problem.item_allowed[item]:
+            return set()
+
+        if self._curr_cap[slot] >= problem.slot_max_cap[slot]:
+            return self._culprits(
+                (other for other in self._trail if self._assigned[other] == slot), depths
+            )
+
+        if (
+            problem.item_alrequired[item]
+            and self._curr_alt_cap[slot] >= problem.slot_alt_max[slot]
+        ):
+            return self._culprits(
+                (
+                    other
+                    for other in self._trail
+                    if self._assigned[other] == slot and problem.item_alrequired[other]
+                ),
+                depths,
+            )
+
+        clashes = problem.slot_clashes[slot]
+        others: List[int] = []
+        if problem.item_is_lec[item]:
+            if problem.item_level[item] == LEVEL_5XX:
+                others += (
+                    other
+                    for other in range(problem.num_items)
+                    if problem.item_is_lec[other]
+                    and problem.item_level[other] == LEVEL_5XX
+                    and other != item
+                )
+            others += problem.item_children[item]
+        elif problem.item_parent[item] >= 0:
+            others.append(problem.item_parent[item])
+        others += problem.item_not_compatible[item]
+        clashing = [other for other in others if self._assigned[other] in clashes]
+        if clashing:
+            return self._culprits(iter(clashing), depths)
+
+        if self._break_symmetry and (other := self._breaks_symmetry(item, slot)) is not None:
+            return self._culprits(iter([other]), depths)
+
+        return self._nogood_reason(item, slot, depths)
+
+    def _nogood_reason(
+        self, item: int, slot: int, depths: Mapping[int, int]
+    ) -> Optional[Set[int]]:
+        """Gets the depths of the other assignments of a recorded nogood that putting the lecture
+        or tutorial in the slot would complete. None if it completes none"""
+        for nogood in self._nogoods.get((item, slot), ()):
+            if all(
+                self._assigned[other] == other_slot
+                for other, other_slot in nogood
+                if other != item
+            ):
+                return {depths[other] for other, _ in nogood if other != item}
+        return None
+
+    def _node_conflict(
+        self, item: int, expanded: Set[int], conflict: Optional[Set[int]]
+    ) -> Optional[Set[int]]:
+        """Gets the depths of the assignments on the trail that caused the current node to fail,
+        given the conflicts of its expanded slots. None if a slot was pruned by the bound"""
+        if conflict is None:
+            return None
+        problem = self._problem
+
+        conflict = set(conflict)
+        depths = {other: depth for depth, other in enumerate(self._trail)}
+        for slot in problem.lec_slots if problem.item_is_lec[item] else problem.tut_slots:
+            if slot in expanded:
                 continue
-            if id1 in curr_sched:
-                sched_item = curr_sched[id1]
-            elif id2 in curr_sched:
-                sched_item = curr_sched[id2]
-            else:
+            reason = self._conflict_reason(item, slot, depths)
+            if reason is None:
+                return None
+            conflict |= reason
+
+        if conflict and len(conflict) <= self._nogood_size:
+            nogood = frozenset(
+                (self._trail[depth], self._assigned[self._trail[depth]]) for depth in conflict
+            )
+            for assignment in nogood:
+                self._nogoods[assignment].append(nogood)
+        return conflict
+
+    def _next_item(self) -> Optional[int]:
+        """Gets the lecture / tutorial to schedule at the current node, None if all are scheduled"""
+        if len(self._trail) == len(self._order):
+            return None
+        if self._dynamic_order:
+            return self._most_constrained_item()
+        return self._order[len(self._trail)]
+
+    def _ordered_slots(self, item: int) -> Iterable[SlotCost]:
+        """Slots of the lecture / tutorial in order of their bounding score contribution (ties by
+        slot), with its slot of the previous schedule first. Only the slots at a day and start
+        time where the course already has a lecture pay a section penalty on top of the presorted
+        preference penalty, so just those are merged back in at their shifted position. Slots
+        that are not allowed for the lecture / tutorial are left out"""
+        problem = self._problem
+        ordered: Iterable[SlotCost] = problem.item_slot_order[item]
+
+        if problem.item_is_lec[item]:
+            course_start = problem.item_course[item] * problem.num_day_starts
+            counts = self._section_counts[course_start : course_start + problem.num_day_starts]
+            if any(counts):
+                slot_day_start = problem.slot_day_start
+                shifted = sorted(
+                    (b_score + counts[slot_day_start[slot]] * problem.pen_section, slot)
+                    for b_score, slot in ordered
+                    if counts[slot_day_start[slot]]
+                )
+                ordered = heapq.merge(
+                    (
+                        slot_cost
+                        for slot_cost in ordered
+                        if not counts[slot_day_start[slot_cost[1]]]
+                    ),
+                    shifted,
+                )
+
+        prior_slot = self._prior_slots.get(item)
+        if prior_slot is not None and prior_slot in problem.item_allowed[item]:
+            ordered = chain(
+                [(self._calc_bounding_score_contrib(item, prior_slot), prior_slot)],
+                (slot_cost for slot_cost in ordered if slot_cost[1] != prior_slot),
+            )
+        return ordered
+
+    def _get_expansions(self, item: int) -> Iterator[Expansion]:
+        """Generates the expansions of the lecture / tutorial at the current leaf in the And-tree
+        search, in order of their bounding score contribution. A slot is only checked against the
+        hard constraints, the best eval score and the nogoods once the search asks for the next
+        expansion, so the siblings pruned by schedules found below the earlier ones are never
+        checked. The search state has to be back at this node whenever it asks"""
+        # The feasible slots were already checked against the hard constraints
+        domain = self._domains[item] if self._dynamic_order else None
+        depths: Optional[Dict[int, int]] = None
+        # Only changes while the search is below an expansion
+        min_eval = self._get_min_eval()
+        for b_score, slot in self._ordered_slots(item):
+            if domain is not None:
+                if slot not in domain:
+                    continue
+            elif self._fail_dynamic_hc(item, slot):
                 continue
-            if _day_overlap(
-                sched_item.lt, sched_item.slot.day, next_lt, next_slot.day
-            ) and _overlap(
-                sched_item.slot.start_time,
-                sched_item.slot.end_time,
-                next_slot.start_time,
-                next_slot.end_time,
-            ):
-                return True
 
-        # Handle unwanted SLOT ASSIGNMENTS
+            if self._get_lower_bound(item, slot, b_score) > min_eval:
+                continue
+            if self._nogoods:
+                if depths is None:
+                    depths = {other: depth for depth, other in enumerate(self._trail)}
+                if self._nogood_reason(item, slot, depths) is not None:
+                    continue
+            yield item, slot, b_score
+            min_eval = self._get_min_eval()
+
+    def _most_constrained_item(self) -> int:
+        """Gets the unassigned lecture / tutorial with the fewest feasible slots left. Ties are
+        broken by _build_order"""
+        return min(
+            (item for item in self._order if self._assigned[item] < 0),
+            key=lambda item: len(self._domains[item]),
+        )
+
+    def _init_domains(self) -> None:
+        """Computes the feasible slots of every unassigned lecture / tutorial"""
+        problem = self._problem
+        self._domains: List[Set[int]] = [set() for _ in range(problem.num_items)]
+        for item in self._order:
+            self._domains[item] = {
+                slot for slot in problem.item_allowed[item] if not self._fail_dynamic_hc(item, slot)
+            }
 
-        if (ident := next_lt.identifier) in self._input_data.unwanted:
-            for uw in self._input_data.unwanted[ident]:
-                if next_slot.day == uw.day and next_slot.start_time == uw.start_time:
-                    return True
+        # (item, slot) of every slot removed from a domain, and the log length before every assignment
+        self._domain_log: List[Tuple[int, int]] = []
+        self._domain_marks: List[int] = []
+
+    def _forward_check(self, item: int, slot: int) -> None:
+        """Removes the slots that became infeasible by scheduling the lecture or tutorial in the
+        slot from the domains of the unassigned lectures / tutorials. The hard constraints only
+        get stricter as assignments are added, so only the slot itself (capacity) and the slots
+        clashing with it (time overlaps) can drop out"""
+        problem = self._problem
+        self._domain_marks.append(len(self._domain_log))
+
+        related = set(problem.item_not_compatible[item])
+        if problem.item_is_lec[item]:
+            related.update(problem.item_children[item])
+            if problem.item_level[item] == LEVEL_5XX:
+                related.update(
+                    other
+                    for other in self._order
+                    if problem.item_is_lec[other] and problem.item_level[other] == LEVEL_5XX
+                )
+        elif problem.item_parent[item] >= 0:
+            related.add(problem.item_parent[item])
 
-        return False
+        symmetric = set()
+        if self._break_symmetry:
+            symmetric = {problem.item_symmetric_prev[item], problem.item_symmetric_next[item]}
 
-    def _get_expansions(self, leaf: Node) -> List[ScheduledItem]:
-        """Gets the expansions of a leaf in the And-tree search. The expansion ordering is as follows:
+        clashes = problem.slot_clashes[slot]
+        for other in self._order:
+            if self._assigned[other] >= 0:
+                continue
+            domain = self._domains[other]
+            if other in symmetric:
+                candidates = domain
+            elif other in related:
+                candidates = domain & clashes
+            else:
+                candidates = set()
+            if slot in domain and slot not in candidates:
+                candidates = [slot, *candidates]
+            for other_slot in list(candidates):
+                if self._fail_dynamic_hc(other, other_slot):
+                    domain.discard(other_slot)
+                    self._domain_log.append((other, other_slot))
+
+    def _undo_forward_check(self) -> None:
+        mark = self._domain_marks.pop()
+        while len(self._domain_log) > mark:
+            other, other_slot = self._domain_log.pop()
+            self._domains[other].add(other_slot)
+
+    def _build_order(self) -> List[int]:
+        """Builds the order in which the search schedules the unassigned lectures and tutorials:
 
         If most recent assignment is a lecture:
             - Assign its tutorial
@@ -319,212 +755,438 @@ class AndTreeSearch:
             - Other tutorial
             - Other lecture
         """
-        chosen_lectut = None
-
-        if (ident := leaf.most_recent_item.lt.identifier) in self._successors:
-            chosen_lectut = self._successors[ident]
-        elif is_lec((lec := leaf.most_recent_item.lt)):
-            for t_id, tut in self._tutorials.items():
-                if tut.parent_lecture_id == lec.identifier:
-                    chosen_lectut = self._tutorials.pop(t_id)
-                    break
-        elif is_tut((most_recent_tut := leaf.most_recent_item.lt)):
-            for t_id, tut in self._tutorials.items():
-                if tut.parent_lecture_id == most_recent_tut.parent_lecture_id:
-                    chosen_lectut = self._tutorials.pop(t_id)
-                    break
-
-        if not chosen_lectut:
-            for lt_bucket in (
-                self._al_required_lectures,
-                self._5XX_lectures,
-                self._evening_lectures,
-                self._tutorials,
-                self._other_lectures,
-            ):
-                if lt_bucket:
-                    _, chosen_lectut = lt_bucket.popitem(last=False)
-                    break
-            else:
-                return []
-
-        self._successors[leaf.most_recent_item.lt.identifier] = chosen_lectut
+        problem = self._problem
 
-        open_slots = (
-            self._open_lecture_slots if is_lec(chosen_lectut) else self._open_tut_slots
+        lectures = {
+            item: problem.items[item]
+            for item in self._item_order
+            if problem.item_is_lec[item] and self._assigned[item] < 0
+        }
+        tutorials = OrderedDict(
+            (item, problem.items[item])
+            for item in self._item_order
+            if not problem.item_is_lec[item] and self._assigned[item] < 0
+        )
+        al_required_lectures = OrderedDict(
+            (item, lec) for item, lec in lectures.items() if lec.alrequired
+        )
+        lectures_5XX = OrderedDict(
+            (item, lec)
+            for item, lec in lectures.items()
+            if lec.level == LEVEL_5XX and item not in al_required_lectures
+        )
+        evening_lectures = OrderedDict(
+            (item, lec)
+            for item, lec in lectures.items()
+            if lec.is_evening
+            and item not in lectures_5XX
+            and item not in al_required_lectures
+        )
+        other_lectures = OrderedDict(
+            (item, lec)
+            for item, lec in lectures.items()
+            if item not in lectures_5XX
+            and item not in evening_lectures
+            and item not in al_required_lectures
         )
 
-        expansions = []
-        for _, os in open_slots.items():
-            if self._fail_hc(self._curr_schedule, chosen_lectut, os):
-                continue
-            next_b_score = self._calc_bounding_score_contrib(chosen_lectut, os)
-            if next_b_score + self._curr_bounding_score > self._min_eval:
-                continue
-            expansions.append(
-                ScheduledItem(chosen_lectut, os, os.current_cap, next_b_score)
-            )
-        return sorted(expansions, key=lambda x: x.b_score_contribution)
+        order: List[int] = []
+        most_recent: Optional[LecTut] = None
+        while True:
+            chosen = None
+            if most_recent is not None and is_lec(most_recent):
+                for t_item, tut in tutorials.items():
+                    if tut.parent_lecture_id == most_recent.identifier:
+                        chosen = t_item
+                        break
+            elif most_recent is not None and is_tut(most_recent):
+                for t_item, tut in tutorials.items():
+                    if tut.parent_lecture_id == most_recent.parent_lecture_id:
+                        chosen = t_item
+                        break
+
+            if chosen is not None:
+                del tutorials[chosen]
+            else:
+                for lt_bucket in (
+                    al_required_lectures,
+                    lectures_5XX,
+                    evening_lectures,
+                    tutorials,
+                    other_lectures,
+                ):
+                    if lt_bucket:
+                        chosen, _ = lt_bucket.popitem(last=False)
+                        break
+                else:
+                    return order
+
+            order.append(chosen)
+            most_recent = problem.items[chosen]
 
     def _init_schedule(self):
-        """Initialize the schedule with the projects edge cases and partial assignments"""
+        """Initialize the schedule with the partial assignments"""
+        problem = self._problem
 
-        # remove Tuesday @ 11-12:30 from slots
-        self._open_lecture_slots = {
-            k: v
-            for k, v in self._open_lecture_slots.items()
-            if not (v.day == "TU" and v.time == "11:00")
-        }
+        # Assign the partial assignments
+        for item, slot in problem.part_assign:
+            if self._fail_hc(item, slot):
+                raise Exception("Partial Assignments failed hard constraints.")
+            self._curr_cap[slot] += 1
+            b_score = self._calc_bounding_score_contrib(item, slot)
+            self._curr_bounding_score += b_score
+            self._assigned[item] = slot
+            self._assigned_b_score[item] = b_score
+            self._cap_at_assign[item] = self._curr_cap[slot]
+
+        for item, slot in problem.part_assign:
+            if problem.item_is_lec[item]:
+                self._section_counts[self._section_key(item, slot)] += 1
+                if problem.item_level[item] == LEVEL_5XX:
+                    self._5XX_cells |= problem.slot_5XX_cells[slot]
+
+        self._init_eval_totals()
+        self._order = self._build_order()
+
+        if self._dynamic_order:
+            self._init_domains()
+
+    def _update_min_deficit(self, item: int, delta: int) -> None:
+        if self._problem.item_is_lec[item]:
+            self._lec_min_deficit += delta
+        else:
+            self._tut_min_deficit += delta
+
+    def _update_unassigned(self, item: int, delta: int) -> None:
+        if self._problem.item_is_lec[item]:
+            self._num_unassigned_lec += delta
+        else:
+            self._num_unassigned_tut += delta
+        self._unassigned_pref_lb += delta * self._min_pref_pen[item]
+
+    def _update_pair_pen(self, item: int, slot: int, delta: int) -> None:
+        pair_pen, pair_lb = self._calc_pair_pen_contrib(item, slot)
+        self._pair_pen += delta * pair_pen
+        self._pair_pen_lb += delta * pair_lb
+
+    def _pre_dfs_updates(self, item: int, slot: int, b_score: float):
+        problem = self._problem
+
+        if self._curr_cap[slot] < problem.slot_min_cap[slot]:
+            self._update_min_deficit(item, -1)
+        self._cap_at_assign[item] = self._curr_cap[slot]
+        self._curr_cap[slot] += 1
+        if problem.item_alrequired[item]:
+            self._curr_alt_cap[slot] += 1
+
+        self._update_unassigned(item, -1)
+        self._update_pair_pen(item, slot, 1)
+        if problem.item_is_lec[item]:
+            self._section_counts[self._section_key(item, slot)] += 1
+            if problem.item_level[item] == LEVEL_5XX:
+                self._5XX_cells |= problem.slot_5XX_cells[slot]
+
+        self._assigned[item] = slot
+        self._assigned_b_score[item] = b_score
+        self._trail.append(item)
+        self._curr_bounding_score += b_score
+
+        if self._dynamic_order:
+            self._forward_check(item, slot)
+
+    def _post_dfs_updates(self):
+        problem = self._problem
+
+        if self._dynamic_order:
+            self._undo_forward_check()
+
+        item = self._trail.pop()
+        slot = self._assigned[item]
+        self._assigned[item] = -1
+        self._curr_bounding_score -= self._assigned_b_score[item]
+
+        self._curr_cap[slot] -= 1
+        if self._curr_cap[slot] < problem.slot_min_cap[slot]:
+            self._update_min_deficit(item, 1)
+        if problem.item_alrequired[item]:
+            self._curr_alt_cap[slot] -= 1
+
+        self._update_unassigned(item, 1)
+        self._update_pair_pen(item, slot, -1)
+        if problem.item_is_lec[item]:
+            self._section_counts[self._section_key(item, slot)] -= 1
+            if problem.item_level[item] == LEVEL_5XX:
+                # Scheduled 5XX lectures never overlap, so no other one covers these cells
+                self._5XX_cells &= ~problem.slot_5XX_cells[slot]
+
+    def _get_min_eval(self) -> float:
+        """Gets the eval score a schedule has to beat, including the ones found by other workers"""
+        if self._shared_min_eval is None:
+            return self._min_eval
+        return min(self._min_eval, self._shared_min_eval.value)
+
+    def _is_new_best(self, ev: float) -> bool:
+        """Checks if a complete schedule improves on the best one and publishes it to other workers"""
+        if ev >= self._min_eval:
+            return False
+        if self._shared_min_eval is None:
+            return True
 
-        initial_schedule: Dict[str, ScheduledItem] = {}
-        self._all_lectures = {
-            item.identifier: item for item in self._input_data.lectures
-        }
-        self._tutorials = OrderedDict(
-            {item.identifier: item for item in self._input_data.tutorials}
+        # Ties with other workers are kept so that the earliest subproblem wins like in the serial search
+        with self._shared_min_eval.get_lock():
+            if ev > self._shared_min_eval.value:
+                return False
+            self._shared_min_eval.value = ev
+        return True
+
+    def cancel(self) -> None:
+        """Stops a running search, which then returns the best schedule found so far. Safe to call
+        from a progress callback or another thread"""
+        self._cancelled = True
+
+    def _should_stop(self) -> bool:
+        """Checks if the search was cancelled or ran out of results, nodes or time"""
+        if self._cancelled:
+            self._stopped = True
+        elif self._break_limit and self._num_results >= self._break_limit:
+            self._stopped = True
+        elif self._node_limit is not None and self._num_nodes >= self._node_limit:
+            self._stopped = True
+        elif self._deadline is not None and time.monotonic() >= self._deadline:
+            self._stopped = True
+        return self._stopped
+
+    def _report_progress(self, force: bool = False) -> None:
+        assert self._progress
+        now = time.monotonic()
+        if not force and now - self._last_progress < self._progress_interval:
+            return
+        self._last_progress = now
+
+        elapsed = now - self._start_time
+        self._progress(
+            SearchProgress(
+                depth=self._num_scheduled(),
+                num_nodes=self._num_nodes,
+                nodes_per_second=self._num_nodes / elapsed if elapsed > 0 else 0.0,
+                best_eval=self._min_eval,
+                elapsed=elapsed,
+            )
         )
 
-        # Add partial assignments for 851 TUT and 913 TUT to TU 18:00 if 351 or 413 exist
-        id_851 = "CPSC 851 TUT 01"
-        id_913 = "CPSC 913 TUT 01"
+    def _record_solution(self, ev: float, res: Dict[str, ScheduledItem]) -> None:
+        self.ans = res
+        self._min_eval = ev
+        self._num_results += 1
+        if self._on_solution:
+            self._on_solution(ev, res)
+
+    def _visit(self) -> Optional[Tuple[int, Iterator[Expansion]]]:
+        """Visits the current node. Returns the lecture / tutorial it schedules and its expansions,
+        or None if the schedule is complete"""
+        self._num_nodes += 1
+        if self._progress:
+            self._report_progress()
+        item = self._next_item()
+        if item is not None:
+            return item, self._get_expansions(item)
+
+        if self._is_new_best(ev := self._get_eval_score()):
+            self._record_solution(ev, self._get_schedule())
+        return None
+
+    def _dfs(self):
+        """Depth first search below the current node. Uses an explicit stack of pending expansions
+        and undoes the scheduled lectures / tutorials on the trail when backtracking"""
+        if self._backjump:
+            return self._backjump_dfs()
+        if self._should_stop():
+            return
+        node = self._visit()
+        if node is None:
+            return
 
-        for _, lec in self._all_lectures.items():
-            if lec.course_id == "CPSC 351":
-                self._tutorials[id_851] = Tutorial(id_851, False)
-                self._input_data.part_assign[id_851] = PartialAssignment(
-                    id_851, "TU", "18:00"
-                )
-                self._NUM_TUT += 1
-                for lt in self._input_data.lectures + self._input_data.tutorials:
-                    if lt.course_id == "CPSC 351":
-                        self._input_data.not_compatible.append(
-                            NotCompatible(lt.identifier, id_851)
-                        )
-
-            if lec.course_id == "CPSC 413":
-                self._tutorials[id_913] = Tutorial(id_913, False)
-                self._input_data.part_assign[id_913] = PartialAssignment(
-                    id_913, "TU", "18:00"
-                )
-                self._NUM_TUT += 1
-                for lt in self._input_data.lectures + self._input_data.tutorials:
-                    if lt.course_id == "CPSC 413":
-                        self._input_data.not_compatible.append(
-                            NotCompatible(lt.identifier, id_913)
-                        )
+        start_depth = len(self._trail)
+        stack: List[Iterator[Expansion]] = [node[1]]
+        while stack:
+            next_expansion = next(stack[-1], None)
+            if next_expansion is None:
+                stack.pop()
+                if len(self._trail) > start_depth:
+                    self._post_dfs_updates()
+                continue
 
-        # Assign the partial assignments
-        for lt_id, p_assign in self._input_data.part_assign.items():
-            if lt_id in self._tutorials:
-                lt = self._tutorials[lt_id]
-                lt_bucket = self._tutorials
-            elif lt_id in self._all_lectures:
-                lt = self._all_lectures[lt_id]
-                lt_bucket = self._all_lectures
-            else:
-                raise Exception(
-                    f"The partial assignment for lecture / tutorial {lt_id} failed because it does not exist in the schedule."
-                )
-            open_slots = (
-                self._open_lecture_slots if is_lec(lt) else self._open_tut_slots
-            )
-            for slot in open_slots.values():
-                if slot.day == p_assign.day and slot.time == p_assign.time:
-                    if self._fail_hc(initial_schedule, lt, slot):
-                        raise Exception("Partial Assignments failed hard constraints.")
-                    slot.current_cap += 1
-                    b_score = self._calc_bounding_score_contrib(lt, slot)
-                    self._curr_bounding_score += b_score
-                    initial_schedule[lt_id] = ScheduledItem(
-                        lt, slot, slot.current_cap, b_score
-                    )
-                    del lt_bucket[lt_id]
-                    break
-            else:
-                raise Exception(
-                    f"The slot for partial assignment {lt_id} {p_assign.day} {p_assign.time} does not exist."
-                )
+            if self._should_stop():
+                break
 
-        self._curr_schedule = initial_schedule
-        self._al_required_lectures = OrderedDict(
-            {
-                item.identifier: item
-                for item in self._all_lectures.values()
-                if item.alrequired
-            }
-        )
-        self._5XX_lectures = OrderedDict(
-            {
-                item.identifier: item
-                for item in self._all_lectures.values()
-                if item.level == LEVEL_5XX
-                and item.identifier not in self._al_required_lectures
-            }
-        )
-        self._evening_lectures = OrderedDict(
-            {
-                item.identifier: item
-                for item in self._all_lectures.values()
-                if item.is_evening
-                and item.identifier not in self._5XX_lectures
-                and item.identifier not in self._al_required_lectures
-            }
-        )
-        self._other_lectures = OrderedDict(
-            {
-                item.identifier: item
-                for item in self._all_lectures.values()
-                if item.identifier not in self._5XX_lectures
-                and item.identifier not in self._evening_lectures
-                and item.identifier not in self._al_required_lectures
-            }
-        )
+            self._pre_dfs_updates(*next_expansion)
+            node = self._visit()
+            if node is None:
+                self._post_dfs_updates()
+            else:
+                stack.append(node[1])
+
+        while len(self._trail) > start_depth:
+            self._post_dfs_updates()
+
+    def _backjump_to(self, levels: List[_Level], conflict: Optional[Set[int]], start_depth: int):
+        """Undoes the assignments of a failed node up to its most recent culprit and adds the
+        remaining culprits to the conflict of the node that made that assignment"""
+        if conflict is None:
+            target = len(self._trail) - 1
+        else:
+            target = max(conflict, default=-1)
+
+        if target < start_depth:
+            # Nothing below the start of the search can fix the failure
+            levels.clear()
+            return
 
-    def _pre_dfs_slot_update(self, sched_item: ScheduledItem) -> None:
-        slot = sched_item.slot
+        del levels[target - start_depth + 1 :]
+        while len(self._trail) > target:
+            self._post_dfs_updates()
+
+        level = levels[-1]
+        if conflict is None or level.conflict is None:
+            level.conflict = None
+        else:
+            level.conflict |= conflict - {target}
+
+    def _backjump_dfs(self):
+        """Depth first search below the current node like _dfs. When a node fails the hard
+        constraints it jumps back to the most recent assignment that caused the failure,
+        skipping the nodes in between that cannot fix it"""
+        if self._should_stop():
+            return
+        node = self._visit()
+        if node is None:
+            return
 
-        slot.current_cap += 1
+        start_depth = len(self._trail)
+        levels = [_Level(node[1], node[0], set(), set())]
+        while levels:
+            level = levels[-1]
+            next_expansion = next(level.expansions, None)
+            if next_expansion is None:
+                levels.pop()
+                conflict = self._node_conflict(level.item, level.expanded, level.conflict)
+                self._backjump_to(levels, conflict, start_depth)
+                continue
+            level.expanded.add(next_expansion[1])
 
-        if sched_item.lt.alrequired:
-            slot.current_alt_cap += 1
+            if self._should_stop():
+                break
 
-    def _post_dfs_slot_update(self, sched_item: ScheduledItem) -> None:
-        slot = sched_item.slot
-        slot.current_cap -= 1
+            self._pre_dfs_updates(*next_expansion)
+            node = self._visit()
+            if node is not None:
+                levels.append(_Level(node[1], node[0], set(), set()))
+                continue
 
-        if sched_item.lt.alrequired:
-            slot.current_alt_cap -= 1
+            # A complete schedule
+            self._backjump_to(levels, None, start_depth)
 
-    def _pre_dfs_updates(self, scheduled_item: ScheduledItem):
-        self._pre_dfs_slot_update(scheduled_item)
-        self._curr_schedule[scheduled_item.lt.identifier] = scheduled_item
-        self._curr_bounding_score += scheduled_item.b_score_contribution
+        while len(self._trail) > start_depth:
+            self._post_dfs_updates()
 
-    def _post_dfs_updates(self, scheduled_item: ScheduledItem):
-        self._post_dfs_slot_update(scheduled_item)
-        del self._curr_schedule[scheduled_item.lt.identifier]
-        self._curr_bounding_score -= scheduled_item.b_score_contribution
+    def _collect_subproblems(
+        self, depth: int, prefix: List[int], subproblems: List[Tuple[int, ...]]
+    ) -> None:
+        """Collects the slot assignments leading to every node `depth` levels below the current one in DFS order"""
+        if depth == 0:
+            subproblems.append(tuple(prefix))
+            return
 
-    def _dfs(self, current_leaf: Node):
-        if self._break_limit and self._num_results >= self._break_limit:
+        item = self._next_item()
+        if item is None:
+            subproblems.append(tuple(prefix))
             return
 
-        expansions = self._get_expansions(current_leaf)
-        print(len(self._curr_schedule), end="\r")
-        if not expansions:
-            if len(self._curr_schedule) == self._NUM_TUT + self._NUM_LEC:
-                res = self._curr_schedule.copy()
-                if (ev := self._get_eval_score()) < self._min_eval:
-                    self.ans = res
-                    self._min_eval = ev
-                    self._num_results += 1
+        for next_expansion in self._get_expansions(item):
+            self._pre_dfs_updates(*next_expansion)
+            prefix.append(next_expansion[1])
+            self._collect_subproblems(depth - 1, prefix, subproblems)
+            prefix.pop()
+            self._post_dfs_updates()
+
+    def _split(self, num_subproblems: int) -> List[Tuple[int, ...]]:
+        """Splits the search tree at its first levels into at least `num_subproblems` subproblems"""
+        subproblems: List[Tuple[int, ...]] = [()]
+        depth = 0
+        while len(subproblems) < num_subproblems:
+            depth += 1
+            next_subproblems: List[Tuple[int, ...]] = []
+            self._collect_subproblems(depth, [], next_subproblems)
+            subproblems = next_subproblems
+            if all(len(prefix) < depth for prefix in subproblems):
+                # Every branch ends before this depth
+                break
+        return subproblems
+
+    def _search_subproblem(self, prefix: Sequence[int]) -> None:
+        """Searches the subtree reached by assigning the slots of the prefix in order"""
+        self._min_eval = float("inf")
+        self.ans = None
+        self._num_results = 0
+        self._stopped = False
+
+        start_depth = len(self._trail)
+        for slot in prefix:
+            item = self._next_item()
+            assert item is not None
+            for next_expansion in self._get_expansions(item):
+                if next_expansion[1] == slot:
+                    break
+            else:
+                # The subproblem was pruned by a schedule found by another worker
+                break
+            self._pre_dfs_updates(*next_expansion)
+        else:
+            self._dfs()
+
+        while len(self._trail) > start_depth:
+            self._post_dfs_updates()
+
+    def _parallel_search(self, workers: int) -> None:
+        if self._should_stop():
             return
+        subproblems = self._split(workers * SUBPROBLEMS_PER_WORKER)
 
-        for next_item in expansions:
-            new_leaf = Node(most_recent_item=next_item)
-            self._pre_dfs_updates(next_item)
-            self._dfs(new_leaf)
-            self._post_dfs_updates(next_item)
+        # Only share the incumbent when optimizing, so the first found schedule matches the serial search
+        shared_min_eval = (
+            multiprocessing.Value("d", self._min_eval) if not self._break_limit else None
+        )
+        # The workers rebuild the search from the problem and plain options, so nothing that
+        # cannot be pickled (like the callbacks) is sent to them
+        options = {
+            "break_limit": self._break_limit,
+            "node_limit": self._node_limit,
+            "dynamic_order": self._dynamic_order,
+            "backjump": self._backjump,
+            "nogood_size": self._nogood_size,
+            "break_symmetry": self._break_symmetry,
+            "item_order": self._item_order,
+        }
+        with multiprocessing.Pool(
+            workers,
+            initializer=_init_worker,
+            initargs=(
+                self._problem,
+                options,
+                self._prior_slots,
+                self._deadline,
+                shared_min_eval,
+            ),
+        ) as pool:
+            # Results arrive in DFS order, so ties are won by the schedule the serial search finds first
+            for ev, ans, num_nodes in pool.imap(_solve_subproblem, subproblems):
+                self._num_nodes += num_nodes
+                if ans is not None and ev < self._min_eval:
+                    self._record_solution(ev, ans)
+                if self._progress:
+                    self._report_progress()
+                if self._should_stop():
+                    break
 
     def get_formatted_answer(self) -> str:
         if not self.ans:
@@ -534,9 +1196,103 @@ class AndTreeSearch:
     def get_formatted_answer_with_eval(self) -> str:
         return f"Eval-value: {self._min_eval}\n{self.get_formatted_answer()}"
 
-    def search(self):
+    def improve(self, time_limit: Optional[float] = None) -> Optional[Dict[str, ScheduledItem]]:
+        """Improves the best schedule found by the search with a local search that relocates and
+        swaps lectures / tutorials, for at most `time_limit` seconds. Improving schedules are
+        reported to the solution callback like the ones found by the search"""
+        if self.ans is None:
+            return None
+
+        problem = self._problem
+        item_index = {item.identifier: i for i, item in enumerate(problem.items)}
+        # The schedule may come from another process, so its slots are matched by value
+        slot_index = {
+            (problem.slot_is_lec[slot], s.day, s.time): slot
+            for slot, s in enumerate(problem.slots)
+        }
+        assigned = [-1] * problem.num_items
+        for ident, sched_item in self.ans.items():
+            item = item_index[ident]
+            assigned[item] = slot_index[
+                (problem.item_is_lec[item], sched_item.slot.day, sched_item.slot.time)
+            ]
+
+        self._start_time = self._last_progress = time.monotonic()
+        self._deadline = self._start_time + time_limit if time_limit is not None else None
+        self._cancelled = False
+
+        def should_stop() -> bool:
+            if self._progress:
+                self._report_progress()
+            return self._cancelled or (
+                self._deadline is not None and time.monotonic() >= self._deadline
+            )
 
-        root = Node(DummyScheduledItem())
-        self._dfs(root)
+        # Every improved schedule is built on the one the search found, not on the previous
+        # improvement, so lectures / tutorials that a later move puts back are reset as well
+        searched = dict(self.ans)
+        local_search = LocalSearch(problem, assigned, self._min_eval, should_stop)
+        for ev in local_search.run():
+            res = dict(searched)
+            for item, slot in enumerate(local_search.assigned):
+                if slot != assigned[item]:
+                    res[problem.items[item].identifier] = ScheduledItem(
+                        problem.items[item],
+                        problem.slots[slot],
+                        local_search.cap_at_assign[item],
+                        local_search.b_scores[item],
+                    )
+            self._record_solution(ev, res)
 
+        if self._progress:
+            self._report_progress(force=True)
         return self.ans
+
+    def search(self, workers: Optional[int] = None):
+        """Searches for the best schedule, splitting the search tree across `workers` processes if given"""
+        self._start_time = self._last_progress = time.monotonic()
+        if self._time_limit is not None:
+            self._deadline = self._start_time + self._time_limit
+        self._stopped = False
+
+        if workers and workers > 1:
+            self._parallel_search(workers)
+        else:
+            self._dfs()
+        self._finished = not self._stopped
+
+        if self._progress:
+            self._report_progress(force=True)
+
+        return self.ans
+
+
+_worker_search: Optional[AndTreeSearch] = None
+
+
+def _init_worker(
+    problem: Problem,
+    options: Dict[str, Any],
+    prior_slots: Dict[int, int],
+    deadline: Optional[float],
+    shared_min_eval: Optional[Synchronized],
+) -> None:
+    global _worker_search
+    # Improving schedules are reported by the parent once they beat the other workers
+    _worker_search = AndTreeSearch(problem, **options)
+    _worker_search._prior_slots = prior_slots
+    _worker_search._deadline = deadline
+    _worker_search._shared_min_eval = shared_min_eval
+
+
+def _solve_subproblem(
+    prefix: Sequence[int],
+) -> Tuple[float, Optional[Dict[str, ScheduledItem]], int]:
+    assert _worker_search
+    num_nodes = _worker_search._num_nodes
+    _worker_search._search_subproblem(prefix)
+    return (
+        _worker_search._min_eval,
+        _worker_search.ans,
+        _worker_search._num_nodes - num_nodes,
+    )
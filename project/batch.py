@@ -0,0 +1,132 @@
+import argparse
+from itertools import product
+import json
+import multiprocessing
+import random
+import sys
+import time
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from project.and_tree import AndTreeSearch
+from project.parser import InputData, parse_input, weigh_input
+from project.problem import SHAQ
+
+# (input file, the eight weight / penalty arguments, weighed input data)
+Job = Tuple[str, Tuple[str, ...], InputData]
+
+
+def _parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(prog="python -m project.batch")
+    parser.add_argument("input_files", nargs="+")
+    parser.add_argument(
+        "--weights",
+        nargs=8,
+        action="append",
+        metavar="WEIGHT",
+        help="w_min_filled w_pref w_pair w_sec_diff pen_lec_min pen_tut_min pen_not_paired"
+        " pen_section. Comma separated values are expanded into a grid, and the option can"
+        " be given several times (default all 1)",
+    )
+    parser.add_argument(
+        "--large",
+        action="store_true",
+        help="Return the first valid schedule instead of the most optimal one",
+    )
+    parser.add_argument("--time-limit", type=float, default=None)
+    parser.add_argument("--node-limit", type=int, default=None)
+    parser.add_argument(
+        "--processes",
+        type=int,
+        default=None,
+        help="Number of solves to run at once (default the number of CPUs)",
+    )
+    parser.add_argument(
+        "--output",
+        default=None,
+        help="Write the results as JSON to this file instead of stdout",
+    )
+    return parser.parse_args()
+
+
+def expand_weights(weights: Sequence[str]) -> List[Tuple[str, ...]]:
+    """Expands the comma separated values of the eight weight / penalty arguments into every
+    combination of them"""
+    return list(product(*(weight.split(",") for weight in weights)))
+
+
+def _solve(job: Job, options: Dict[str, Any]) -> Dict[str, Any]:
+    input_file, weights, input_data = job
+    # Every solve shuffles like a single run of project.main
+    random.seed(SHAQ)
+
+    start = time.perf_counter()
+    search = AndTreeSearch(input_data, **options)
+    search.search()
+    solve_seconds = time.perf_counter() - start
+
+    return {
+        "input_file": input_file,
+        "weights": list(weights),
+        "eval": search.best_eval if search.ans is not None else None,
+        "num_nodes": search.num_nodes,
+        "solve_seconds": solve_seconds,
+        "schedule": search.get_formatted_answer(),
+    }
+
+
+def _solve_job(args: Tuple[Job, Dict[str, Any]]) -> Dict[str, Any]:
+    return _solve(*args)
+
+
+def run_batch(
+    input_files: Sequence[str],
+    weight_grid: Sequence[Sequence[str]],
+    options: Dict[str, Any],
+    processes: Optional[int] = None,
+) -> Dict[str, Any]:
+    """Solves every input file with every weight setting across a process pool. Each file is
+    parsed once and weighed for every setting"""
+    parse_seconds: Dict[str, float] = {}
+    jobs: List[Job] = []
+    for input_file in input_files:
+        start = time.perf_counter()
+        parsed_file = parse_input(input_file)
+        parse_seconds[input_file] = time.perf_counter() - start
+        for weights in weight_grid:
+            jobs.append((input_file, tuple(weights), weigh_input(parsed_file, *weights)))
+
+    with multiprocessing.Pool(processes) as pool:
+        results = pool.map(_solve_job, [(job, options) for job in jobs], chunksize=1)
+
+    return {"parse_seconds": parse_seconds, "results": results}
+
+
+def main():
+    args = _parse_args()
+
+    weight_grid: List[Tuple[str, ...]] = []
+    for weights in args.weights or [["1"] * 8]:
+        weight_grid += expand_weights(weights)
+
+    options: Dict[str, Any] = {
+        "time_limit": args.time_limit,
+        "node_limit": args.node_limit,
+    }
+    if args.large:
+        options["shuffle"] = True
+        # With a budget, keep improving the first schedule until the budget runs out
+        if args.time_limit is None and args.node_limit is None:
+            options["break_limit"] = 1
+
+    output = run_batch(args.input_files, weight_grid, options, args.processes)
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(output, f, indent=2)
+    else:
+        json.dump(output, sys.stdout, indent=2)
+        print()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,43 @@
+import hashlib
+import os
+from pathlib import Path
+import pickle
+import tempfile
+from typing import Sequence
+
+from project.parser import get_input_data
+from project.problem import Problem, compile_problem
+
+# Bump when Problem changes, so that problems cached by older versions are not loaded
+CACHE_VERSION = 4
+
+
+def _cache_key(content: bytes, weights: Sequence[str], shuffle: bool) -> str:
+    digest = hashlib.sha256(content)
+    digest.update(repr((CACHE_VERSION, tuple(weights), shuffle)).encode())
+    return digest.hexdigest()
+
+
+def load_problem(
+    content: bytes,
+    weights: Sequence[str],
+    cache_dir: str | Path,
+    shuffle: bool = False,
+) -> Problem:
+    """Gets the compiled problem of an input file's content and the eight weight / penalty
+    arguments from the cache directory. On a miss it is parsed, compiled and stored there"""
+    cache_path = Path(cache_dir) / f"{_cache_key(content, weights, shuffle)}.pickle"
+    if cache_path.exists():
+        with open(cache_path, "rb") as f:
+            return pickle.load(f)
+
+    input_data = get_input_data(content.decode().splitlines(), *weights)
+    problem = compile_problem(input_data, shuffle=shuffle)
+
+    # Write to a temporary file first, so concurrent runs never load a partly written problem
+    cache_path.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=cache_path.parent, suffix=".tmp")
+    with os.fdopen(fd, "wb") as f:
+        pickle.dump(problem, f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp_path, cache_path)
+    return problem
@@ -1,19 +1,35 @@
-from typing import get_type_hints, Type, TypeVar
+from typing import Any, Callable, Dict, List, get_type_hints, Type, TypeVar
 
 T = TypeVar("T", bound="CSVParsable")
 
+Converter = Callable[[str], Any]
+
+# Converters of the fields of every parsed class, built on first use
+_converters: Dict[type, List[Converter]] = {}
+
+
+def _to_bool(raw: str) -> bool:
+    return raw.lower() in ("1", "true", "yes")
+
 
 class CSVParsable:
     """Helper class to parse comma seperated inputs"""
+    @classmethod
+    def _get_converters(cls) -> List[Converter]:
+        converters = _converters.get(cls)
+        if converters is None:
+            converters = [
+                _to_bool if ftype == bool else ftype
+                for ftype in get_type_hints(cls).values()
+            ]
+            _converters[cls] = converters
+        return converters
+
     @classmethod
     def from_csv(cls: Type[T], line: str) -> T:
-        parts = [p.strip() for p in line.split(",")]
-        hints = get_type_hints(cls)
-
-        converted = []
-        for raw, (_, ftype) in zip(parts, hints.items()):
-            if ftype == bool:
-                converted.append(raw.lower() in ("1", "true", "yes"))
-            else:
-                converted.append(ftype(raw))
-        return cls(*converted)
+        return cls(
+            *[
+                convert(raw.strip())
+                for raw, convert in zip(line.split(","), cls._get_converters())
+            ]
+        )
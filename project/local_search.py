@@ -0,0 +1,215 @@
+from typing import Callable, Iterator, List, Optional, Sequence, Tuple
+
+from project.problem import LEVEL_5XX, Problem
+
+
+class LocalSearch:
+    """Hill climbing over complete schedules. Starting from a valid schedule, it relocates single
+    lectures / tutorials to other slots and swaps the slots of two lectures or two tutorials,
+    keeping every move that passes the hard constraints and lowers the eval score. The partial
+    assignments are never moved"""
+
+    def __init__(
+        self,
+        problem: Problem,
+        assigned: Sequence[int],
+        eval_score: float,
+        should_stop: Optional[Callable[[], bool]] = None,
+    ) -> None:
+        self._problem = problem
+        self._assigned = list(assigned)
+        self.eval_score = eval_score
+        self._should_stop = should_stop
+
+        fixed = {item for item, _ in problem.part_assign}
+        self._movable = [item for item in range(problem.num_items) if item not in fixed]
+        # Time cells covered by the 5XX lectures, see Problem.slot_5XX_cells
+        self._5XX_cells = 0
+
+        self._curr_cap = [0] * len(problem.slots)
+        self._curr_alt_cap = [0] * len(problem.slots)
+        self._section_counts = [0] * (problem.num_courses * problem.num_day_starts)
+        for item, slot in enumerate(self._assigned):
+            self._curr_cap[slot] += 1
+            if problem.item_alrequired[item]:
+                self._curr_alt_cap[slot] += 1
+            if problem.item_is_lec[item]:
+                self._section_counts[self._section_key(item, slot)] += 1
+                if problem.item_level[item] == LEVEL_5XX:
+                    self._5XX_cells |= problem.slot_5XX_cells[slot]
+
+        # Capacity of the slot and bounding score contribution when a lecture / tutorial was last moved
+        self.cap_at_assign = [0] * problem.num_items
+        self.b_scores = [0] * problem.num_items
+
+        self.num_moves = 0
+
+    @property
+    def assigned(self) -> List[int]:
+        return list(self._assigned)
+
+    def _section_key(self, item: int, slot: int) -> int:
+        problem = self._problem
+        return (
+            problem.item_course[item] * problem.num_day_starts
+            + problem.slot_day_start[slot]
+        )
+
+    def _calc_pair_pen(self, item: int, slot: int) -> int:
+        """Pair penalty between a lecture or tutorial in the slot and its assigned partners"""
+        problem = self._problem
+        day_time = problem.slot_day_time[slot]
+        return sum(
+            problem.pen_not_paired
+            for other in problem.item_pairs[item]
+            if self._assigned[other] >= 0
+            and problem.slot_day_time[self._assigned[other]] != day_time
+        )
+
+    def _min_pen(self, item: int) -> int:
+        if self._problem.item_is_lec[item]:
+            return self._problem.pen_lec_min
+        return self._problem.pen_tut_min
+
+    def _fail_hc(self, item: int, slot: int) -> bool:
+        """Check if adding the lecture/tutorial in the given slot fails hard constraints, like
+        AndTreeSearch._fail_hc"""
+        problem = self._problem
+
+        if slot not in problem.item_allowed[item]:
+            return True
+
+        if self._curr_cap[slot] >= problem.slot_max_cap[slot]:
+            return True
+
+        if (
+            problem.item_alrequired[item]
+            and self._curr_alt_cap[slot] >= problem.slot_alt_max[slot]
+        ):
+            return True
+
+        clashes = problem.slot_clashes[slot]
+
+        if problem.item_is_lec[item]:
+            if (
+                problem.item_level[item] == LEVEL_5XX
+                and self._5XX_cells & problem.slot_5XX_cells[slot]
+            ):
+                return True
+
+            for tut in problem.item_children[item]:
+                if self._assigned[tut] in clashes:
+                    return True
+        elif (parent := problem.item_parent[item]) >= 0:
+            if self._assigned[parent] in clashes:
+                return True
+
+        for other in problem.item_not_compatible[item]:
+            if self._assigned[other] in clashes:
+                return True
+
+        return False
+
+    def _unassign(self, item: int) -> float:
+        """Takes a lecture or tutorial out of the schedule and returns the change in eval score"""
+        problem = self._problem
+        slot = self._assigned[item]
+        self._assigned[item] = -1
+
+        delta: float = -problem.item_pref_pen[item][slot] - self._calc_pair_pen(item, slot)
+        self._curr_cap[slot] -= 1
+        if self._curr_cap[slot] < problem.slot_min_cap[slot]:
+            delta += self._min_pen(item)
+        if problem.item_alrequired[item]:
+            self._curr_alt_cap[slot] -= 1
+        if problem.item_is_lec[item]:
+            key = self._section_key(item, slot)
+            self._section_counts[key] -= 1
+            delta -= self._section_counts[key] * problem.pen_section
+            if problem.item_level[item] == LEVEL_5XX:
+                self._5XX_cells &= ~problem.slot_5XX_cells[slot]
+        return delta
+
+    def _assign(self, item: int, slot: int) -> float:
+        """Puts an unassigned lecture or tutorial in the slot and returns the change in eval score"""
+        problem = self._problem
+
+        b_score = problem.item_pref_pen[item][slot]
+        delta: float = self._calc_pair_pen(item, slot)
+        if self._curr_cap[slot] < problem.slot_min_cap[slot]:
+            delta -= self._min_pen(item)
+        self.cap_at_assign[item] = self._curr_cap[slot]
+        self._curr_cap[slot] += 1
+        if problem.item_alrequired[item]:
+            self._curr_alt_cap[slot] += 1
+        if problem.item_is_lec[item]:
+            key = self._section_key(item, slot)
+            b_score += self._section_counts[key] * problem.pen_section
+            self._section_counts[key] += 1
+            if problem.item_level[item] == LEVEL_5XX:
+                self._5XX_cells |= problem.slot_5XX_cells[slot]
+
+        self._assigned[item] = slot
+        self.b_scores[item] = b_score
+        return delta + b_score
+
+    def _try_move(self, moves: List[Tuple[int, int]]) -> bool:
+        """Reassigns the lectures / tutorials to the given slots. Keeps the move if it passes the
+        hard constraints and lowers the eval score, otherwise restores the previous slots"""
+        prev = [(item, self._assigned[item]) for item, _ in moves]
+
+        delta: float = 0
+        for item, _ in moves:
+            delta += self._unassign(item)
+        done = 0
+        for item, slot in moves:
+            if self._fail_hc(item, slot):
+                break
+            delta += self._assign(item, slot)
+            done += 1
+        else:
+            if delta < 0:
+                self.eval_score += delta
+                self.num_moves += 1
+                return True
+
+        for item, _ in moves[:done]:
+            self._unassign(item)
+        for item, slot in prev:
+            self._assign(item, slot)
+        return False
+
+    def _neighbours(self, item: int) -> Iterator[List[Tuple[int, int]]]:
+        """Relocations of the lecture or tutorial to every other slot of its type, then swaps with
+        every later movable lecture or tutorial of the same type"""
+        problem = self._problem
+        slot = self._assigned[item]
+        is_lec_item = problem.item_is_lec[item]
+
+        for other_slot in problem.lec_slots if is_lec_item else problem.tut_slots:
+            if other_slot != slot:
+                yield [(item, other_slot)]
+
+        for other in self._movable:
+            if (
+                other > item
+                and problem.item_is_lec[other] == is_lec_item
+                and self._assigned[other] != slot
+            ):
+                yield [(item, self._assigned[other]), (other, slot)]
+
+    def run(self) -> Iterator[float]:
+        """Applies improving moves until no move improves the schedule or the search should stop.
+        Yields the eval score after every improving move"""
+        improved = True
+        while improved:
+            improved = False
+            for item in self._movable:
+                if self._should_stop and self._should_stop():
+                    return
+                for moves in self._neighbours(item):
+                    if self._try_move(moves):
+                        improved = True
+                        yield self.eval_score
+                        break
+
@@ -1,35 +1,200 @@
+import argparse
+from contextlib import nullcontext
 import sys
-from project.parser import get_input_data
-from project.and_tree import AndTreeSearch
+from project.cache import load_problem
+from project.parser import get_input_data, parse_schedule
+from project.and_tree import AndTreeSearch, SearchProgress, _get_formatted_schedule
+from project.portfolio import portfolio_search
+from project.problem import SHAQ
 import random
 
-SHAQ = 32
 random.seed(SHAQ)
 
 
-def main():
-    input_data = get_input_data(
-        sys.argv[1],
-        sys.argv[2],
-        sys.argv[3],
-        sys.argv[4],
-        sys.argv[5],
-        sys.argv[6],
-        sys.argv[7],
-        sys.argv[8],
-        sys.argv[9],
+def _parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(prog="python -m project.main")
+    parser.add_argument("input_file", help="Input file, or - to read it from stdin")
+    parser.add_argument(
+        "weights",
+        nargs=8,
+        metavar="WEIGHT",
+        help="w_min_filled w_pref w_pair w_sec_diff pen_lec_min pen_tut_min pen_not_paired pen_section",
+    )
+    parser.add_argument(
+        "large",
+        nargs="?",
+        help="Any value returns the first valid schedule instead of the most optimal one",
+    )
+    parser.add_argument(
+        "--cache-dir",
+        default=None,
+        help="Store the compiled input in this directory and load it from there on repeat runs",
+    )
+    parser.add_argument(
+        "--warm-start",
+        default=None,
+        metavar="SCHEDULE",
+        help="A previous output of this program to try first and, if still valid, to beat",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=None,
+        help="Number of processes to split the search across",
+    )
+    parser.add_argument(
+        "--portfolio",
+        type=int,
+        default=None,
+        metavar="N",
+        help="Run N differently ordered searches in parallel, restarting each after a growing number of nodes",
+    )
+    parser.add_argument(
+        "--time-limit",
+        type=float,
+        default=None,
+        help="Stop after this many seconds and return the best schedule found so far",
+    )
+    parser.add_argument(
+        "--node-limit",
+        type=int,
+        default=None,
+        help="Stop after visiting this many nodes (per process) and return the best schedule found so far",
+    )
+    parser.add_argument(
+        "--dynamic-order",
+        action="store_true",
+        help="Always schedule the lecture / tutorial with the fewest feasible slots left next",
+    )
+    parser.add_argument(
+        "--backjump",
+        action="store_true",
+        help="Jump back to the assignment that caused a dead end instead of the last one",
+    )
+    parser.add_argument(
+        "--nogood-size",
+        type=int,
+        default=0,
+        metavar="N",
+        help="With --backjump, remember the causes of dead ends with at most N assignments",
+    )
+    parser.add_argument(
+        "--break-symmetry",
+        action="store_true",
+        help="Only explore one order of the slots of interchangeable tutorials",
+    )
+    parser.add_argument(
+        "--improve",
+        type=float,
+        default=None,
+        metavar="SECONDS",
+        help="Improve the schedule found by the search with a local search for at most SECONDS",
     )
+    parser.add_argument(
+        "--output",
+        default=None,
+        help="Append every improving schedule and its eval-value to this file as it is found",
+    )
+    parser.add_argument(
+        "--progress",
+        type=float,
+        nargs="?",
+        const=1.0,
+        default=None,
+        metavar="SECONDS",
+        help="Print the search progress to stderr every SECONDS (default 1)",
+    )
+    args = parser.parse_args()
+    if args.portfolio is not None:
+        for flag, value in (
+            ("--workers", args.workers),
+            ("--node-limit", args.node_limit),
+            ("--warm-start", args.warm_start),
+            ("--improve", args.improve),
+            ("--output", args.output),
+            ("--progress", args.progress),
+        ):
+            if value is not None:
+                parser.error(f"{flag} cannot be used with --portfolio")
+    return args
+
+
+def _print_progress(progress: SearchProgress) -> None:
+    print(
+        f"depth {progress.depth} | {progress.num_nodes} nodes"
+        f" ({progress.nodes_per_second:.0f}/s) | best eval {progress.best_eval}",
+        end="\r",
+        file=sys.stderr,
+        flush=True,
+    )
+
+
+def main():
+    args = _parse_args()
     shuffle = False
-    if len(sys.argv) > 10:
-        break_limit = 1
+    break_limit = None
+    if args.large is not None:
         shuffle = True
+        # With a budget, keep improving the first schedule until the budget runs out
+        if args.time_limit is None and args.node_limit is None:
+            break_limit = 1
+
+    if args.cache_dir:
+        if args.input_file == "-":
+            content = sys.stdin.buffer.read()
+        else:
+            with open(args.input_file, "rb") as f:
+                content = f.read()
+        input_data = load_problem(content, args.weights, args.cache_dir, shuffle=shuffle)
     else:
-        break_limit = None
+        input_data = get_input_data(
+            sys.stdin if args.input_file == "-" else args.input_file, *args.weights
+        )
 
-    search = AndTreeSearch(input_data, break_limit=break_limit, shuffle=shuffle)
-    search.search()
-    print(search.get_formatted_answer_with_eval())
+    if args.portfolio is not None:
+        result = portfolio_search(
+            input_data,
+            args.portfolio,
+            time_limit=args.time_limit,
+            first_feasible=break_limit == 1,
+            seed=SHAQ,
+            dynamic_order=args.dynamic_order,
+            backjump=args.backjump,
+            nogood_size=args.nogood_size,
+            break_symmetry=args.break_symmetry,
+        )
+        print(result.get_formatted_answer_with_eval())
+        return
 
+    with open(args.output, "a") if args.output else nullcontext() as output:
+        on_solution = None
+        if output is not None:
+
+            def on_solution(ev, sched):
+                output.write(f"Eval-value: {ev}\n{_get_formatted_schedule(sched)}\n\n")
+                output.flush()
+
+        search = AndTreeSearch(
+            input_data,
+            break_limit=break_limit,
+            shuffle=shuffle,
+            time_limit=args.time_limit,
+            node_limit=args.node_limit,
+            on_solution=on_solution,
+            progress=_print_progress if args.progress is not None else None,
+            progress_interval=args.progress or 1.0,
+            dynamic_order=args.dynamic_order,
+            backjump=args.backjump,
+            nogood_size=args.nogood_size,
+            break_symmetry=args.break_symmetry,
+            warm_start=parse_schedule(args.warm_start) if args.warm_start else None,
+        )
+        search.search(workers=args.workers)
+        if args.improve is not None:
+            search.improve(time_limit=args.improve)
+    if args.progress is not None:
+        print(file=sys.stderr)
+    print(search.get_formatted_answer_with_eval())
 
 if __name__ == "__main__":
     main()
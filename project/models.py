@@ -32,8 +32,6 @@ class BaseSlot(CSVParsable):
     identifier: str = field(default="", init=False)
     start_time: float = field(init=False)
     end_time: float = field(init=False)
-    current_cap: int = field(default=0, init=False)
-    current_alt_cap: int = field(default=0, init=False)
     identifier_suffix = ""
 
     def __post_init__(self) -> None:
@@ -1,7 +1,7 @@
 from collections import defaultdict
-from dataclasses import dataclass, field
+from dataclasses import dataclass, field, replace
 from pathlib import Path
-from typing import Dict, List
+from typing import Dict, Iterable, List, Tuple, Union
 
 from project.models import (
     LectureSlot,
@@ -63,33 +63,43 @@ headers = {
 }
 
 
-def _parse_file(path: str | Path):
-    parsed = ParsedFile()
+# A path to an input file, or its lines (for example an open file or a list of strings)
+InputSource = Union[str, Path, Iterable[str]]
+
 
-    with open(path) as f:
-        current_attr = None
-        current_cls = None
+def _parse_lines(lines: Iterable[str]) -> ParsedFile:
+    parsed = ParsedFile()
 
-        for raw in f:
-            line = raw.strip()
-            if not line:
-                continue
-            if line in headers:
-                header_name = line
+    entries = None
+    from_csv = None
 
-                current_attr, current_cls = headers[header_name]
-                continue
+    for raw in lines:
+        line = raw.strip()
+        if not line:
+            continue
+        if line in headers:
+            current_attr, current_cls = headers[line]
+            entries = getattr(parsed, current_attr)
+            from_csv = current_cls.from_csv
+            continue
 
-            assert current_cls
-            assert current_attr
-            entry = current_cls.from_csv(line)
-            getattr(parsed, current_attr).append(entry)
+        assert from_csv
+        assert entries is not None
+        entries.append(from_csv(line))
 
     return parsed
 
 
-def get_input_data(
-    path: str | Path,
+def parse_input(source: InputSource) -> ParsedFile:
+    """Parses an input file without applying the weights, see weigh_input"""
+    if isinstance(source, (str, Path)):
+        with open(source) as f:
+            return _parse_lines(f)
+    return _parse_lines(source)
+
+
+def weigh_input(
+    parsed_file: ParsedFile,
     w_min_filled: str,
     w_pref: str,
     w_pair: str,
@@ -99,9 +109,8 @@ def get_input_data(
     pen_not_paired: str,
     pen_section: str,
 ) -> InputData:
-    """Get all the inputted data and raise exceptions on invalid inputs"""
-    parsed_file = _parse_file(path)
-
+    """Applies the weights and penalties to a parsed input file. The parsed file is not changed,
+    so it can be weighed several times"""
     unwanted: Dict[str, List[Unwanted]] = defaultdict(list)
 
     for uw in parsed_file.unwanted:
@@ -110,7 +119,7 @@ def get_input_data(
     preferences: Dict[str, List[Preference]] = defaultdict(list)
 
     for pref in parsed_file.preferences:
-        pref.pref_val *= int(w_pref)
+        pref = replace(pref, pref_val=pref.pref_val * int(w_pref))
         preferences[pref.identifier].append(pref)
 
     part_assign: Dict[str, PartialAssignment] = {}
@@ -134,3 +143,47 @@ def get_input_data(
         pen_tut_min=int(pen_tut_min) * int(w_min_filled),
         pen_section=int(pen_section) * int(w_sec_diff),
     )
+
+
+def get_input_data(
+    source: InputSource,
+    w_min_filled: str,
+    w_pref: str,
+    w_pair: str,
+    w_sec_diff: str,
+    pen_lec_min: str,
+    pen_tut_min: str,
+    pen_not_paired: str,
+    pen_section: str,
+) -> InputData:
+    """Get all the inputted data and raise exceptions on invalid inputs. The input is read from a
+    file path or from an iterable of lines such as an open file"""
+    return weigh_input(
+        parse_input(source),
+        w_min_filled,
+        w_pref,
+        w_pair,
+        w_sec_diff,
+        pen_lec_min,
+        pen_tut_min,
+        pen_not_paired,
+        pen_section,
+    )
+
+
+def parse_schedule(source: InputSource) -> Dict[str, Tuple[str, str]]:
+    """Parses a schedule in the format printed by project.main (an eval-value line followed by
+    one "identifier : day, time" line per lecture / tutorial). Returns the day and time of
+    every lecture / tutorial"""
+    if isinstance(source, (str, Path)):
+        with open(source) as f:
+            return parse_schedule(list(f))
+
+    schedule: Dict[str, Tuple[str, str]] = {}
+    for raw in source:
+        if " : " not in raw:
+            continue
+        identifier, slot = raw.split(" : ", 1)
+        day, time = (part.strip() for part in slot.split(","))
+        schedule[identifier.strip()] = (day, time)
+    return schedule
@@ -0,0 +1,180 @@
+from dataclasses import dataclass
+import multiprocessing
+from multiprocessing.synchronize import Event
+import random
+import time
+from typing import Any, Dict, Optional, Tuple, Union
+
+from project.and_tree import (
+    AndTreeSearch,
+    ScheduledItem,
+    SearchProgress,
+    _get_formatted_schedule,
+)
+from project.parser import InputData
+from project.problem import Problem, compile_problem
+
+# Nodes of the first restart, later restarts get a multiple of it from the Luby sequence
+BASE_NODE_LIMIT = 1000
+
+# Seconds between checks of a running search for a stop signal from the other workers
+STOP_CHECK_INTERVAL = 0.05
+
+# (best eval score, its schedule, number of restarts, number of nodes, whether a restart finished
+# without running out of nodes)
+WorkerResult = Tuple[float, Optional[Dict[str, ScheduledItem]], int, int, bool]
+
+
+def luby(i: int) -> int:
+    """The i-th element (from 1) of the Luby sequence 1, 1, 2, 1, 1, 2, 4, 1, 1, 2, ..."""
+    k = 1
+    while (1 << k) - 1 < i:
+        k += 1
+    if i == (1 << k) - 1:
+        return 1 << (k - 1)
+    return luby(i - (1 << (k - 1)) + 1)
+
+
+@dataclass(frozen=True, slots=True)
+class PortfolioResult:
+    eval_score: float
+    ans: Optional[Dict[str, ScheduledItem]]
+    num_restarts: int
+    num_nodes: int
+
+    def get_formatted_answer(self) -> str:
+        if not self.ans:
+            return "No valid schedule!"
+        return _get_formatted_schedule(self.ans)
+
+    def get_formatted_answer_with_eval(self) -> str:
+        return f"Eval-value: {self.eval_score}\n{self.get_formatted_answer()}"
+
+
+_worker_problem: Optional[Problem] = None
+_worker_options: Dict[str, Any] = {}
+_worker_stop: Optional[Event] = None
+
+
+def _init_worker(problem: Problem, options: Dict[str, Any], stop: Event) -> None:
+    global _worker_problem, _worker_options, _worker_stop
+    _worker_problem = problem
+    _worker_options = options
+    _worker_stop = stop
+
+
+def _run_restarts(worker: int) -> WorkerResult:
+    """Runs randomly ordered searches with growing node limits until one finds a schedule (first
+    feasible mode), a search finishes within its node limit, the deadline passes or another
+    worker signals to stop. Every restart starts from the best schedule found so far"""
+    assert _worker_problem and _worker_stop
+    problem, options, stop = _worker_problem, _worker_options, _worker_stop
+    workers = options["workers"]
+    deadline = options["deadline"]
+
+    best_eval = float("inf")
+    best_ans: Optional[Dict[str, ScheduledItem]] = None
+    num_nodes = 0
+    restart = 0
+    while not stop.is_set():
+        time_limit = None
+        if deadline is not None:
+            time_limit = deadline - time.monotonic()
+            if time_limit <= 0:
+                break
+
+        restart += 1
+        item_order = list(range(problem.num_items))
+        random.Random(options["seed"] + worker + (restart - 1) * workers).shuffle(item_order)
+        node_limit = options["base_node_limit"] * luby(restart)
+
+        # Only used to stop the search once another worker is done
+        def on_progress(_: SearchProgress) -> None:
+            if stop.is_set():
+                search.cancel()
+
+        search = AndTreeSearch(
+            problem,
+            break_limit=1 if options["first_feasible"] else None,
+            time_limit=time_limit,
+            node_limit=node_limit,
+            progress=on_progress,
+            progress_interval=STOP_CHECK_INTERVAL,
+            warm_start=(
+                {ident: (item.slot.day, item.slot.time) for ident, item in best_ans.items()}
+                if best_ans
+                else None
+            ),
+            item_order=item_order,
+            **options["search_options"],
+        )
+        search.search()
+        num_nodes += search.num_nodes
+
+        if search.ans is not None and search.best_eval < best_eval:
+            best_eval, best_ans = search.best_eval, search.ans
+            if options["first_feasible"]:
+                break
+
+        if search.finished:
+            return best_eval, best_ans, restart, num_nodes, True
+
+    return best_eval, best_ans, restart, num_nodes, False
+
+
+def portfolio_search(
+    input_data: Union[InputData, Problem],
+    workers: int,
+    time_limit: Optional[float] = None,
+    first_feasible: bool = True,
+    base_node_limit: int = BASE_NODE_LIMIT,
+    seed: int = 0,
+    **search_options: Any,
+) -> PortfolioResult:
+    """Runs differently seeded, randomly ordered searches in `workers` processes, restarting each
+    after a growing number of nodes (Luby sequence). With first_feasible it returns as soon as
+    any search finds a valid schedule, otherwise the best schedule found before the time limit,
+    or earlier once a search proves it optimal"""
+    # Compiled once, the restarts only change the order of the lectures / tutorials
+    problem = input_data if isinstance(input_data, Problem) else compile_problem(input_data)
+    options = {
+        "workers": workers,
+        "deadline": time.monotonic() + time_limit if time_limit is not None else None,
+        "first_feasible": first_feasible,
+        "base_node_limit": base_node_limit,
+        "seed": seed,
+        "search_options": search_options,
+    }
+
+    best_eval = float("inf")
+    best_ans: Optional[Dict[str, ScheduledItem]] = None
+    proven = False
+    num_restarts = num_nodes = 0
+    stop = multiprocessing.Event()
+    pool = multiprocessing.Pool(
+        workers, initializer=_init_worker, initargs=(problem, options, stop)
+    )
+    try:
+        # Once one worker is done, the others are signalled to stop and return what they have
+        for ev, ans, restarts, nodes, finished in pool.imap_unordered(
+            _run_restarts, range(workers)
+        ):
+            num_restarts += restarts
+            num_nodes += nodes
+            if proven:
+                continue
+            if finished:
+                # The search either proved its schedule optimal or that there is none
+                best_eval, best_ans, proven = ev, ans, True
+            elif ans is not None and ev < best_eval:
+                best_eval, best_ans = ev, ans
+            if finished or (first_feasible and best_ans is not None):
+                stop.set()
+        pool.close()
+    except BaseException:
+        pool.terminate()
+        raise
+    finally:
+        pool.join()
+
+    return PortfolioResult(best_eval, best_ans, num_restarts, num_nodes)
@@ -0,0 +1,374 @@
+from dataclasses import dataclass
+import random
+from typing import Dict, FrozenSet, List, Set, Tuple
+
+from project.models import (
+    LecTut,
+    LecTutSlot,
+    PartialAssignment,
+    Tutorial,
+    is_lec,
+    is_tut,
+)
+from project.parser import InputData
+
+EVENING_TIME = 18
+LEVEL_5XX = 5
+
+# Seed of the shuffled order used for large inputs
+SHAQ = 32
+
+
+@dataclass(frozen=True, slots=True)
+class Problem:
+    """Integer indexed form of the input data used by the search. Lectures and tutorials (items)
+    and slots are numbered densely and their attributes are stored in flat tuples. A problem is
+    never changed after it is compiled, so any number of searches can share it"""
+
+    # Items: lectures first, then tutorials, in input order
+    items: Tuple[LecTut, ...]
+    item_is_lec: Tuple[bool, ...]
+    item_level: Tuple[int, ...]
+    item_evening: Tuple[bool, ...]
+    item_alrequired: Tuple[bool, ...]
+    item_course: Tuple[int, ...]
+    # Parent lecture of a tutorial, -1 if it has none
+    item_parent: Tuple[int, ...]
+    # Tutorials of a lecture
+    item_children: Tuple[Tuple[int, ...], ...]
+    item_not_compatible: Tuple[Tuple[int, ...], ...]
+    item_pairs: Tuple[Tuple[int, ...], ...]
+    # Slots the item is unwanted in
+    item_unwanted: Tuple[FrozenSet[int], ...]
+    # (day / start time key, preference value) of every preference of the item
+    item_prefs: Tuple[Tuple[Tuple[int, int], ...], ...]
+    # Slots of the item's type that pass the hard constraints that do not depend on the rest of
+    # the schedule: not unwanted, and in the evening for evening lectures / tutorials
+    item_allowed: Tuple[FrozenSet[int], ...]
+    # item_pref_pen[item][slot] is the preference penalty of putting the item in the slot
+    item_pref_pen: Tuple[Tuple[int, ...], ...]
+    # (preference penalty, slot) of the allowed slots of the item, sorted
+    item_slot_order: Tuple[Tuple[Tuple[int, int], ...], ...]
+    # Previous / next tutorial the item is interchangeable with, -1 if there is none
+    item_symmetric_prev: Tuple[int, ...]
+    item_symmetric_next: Tuple[int, ...]
+
+    # Slots: lecture slots first, then tutorial slots, in input order
+    slots: Tuple[LecTutSlot, ...]
+    slot_is_lec: Tuple[bool, ...]
+    slot_start: Tuple[float, ...]
+    slot_max_cap: Tuple[int, ...]
+    slot_min_cap: Tuple[int, ...]
+    slot_alt_max: Tuple[int, ...]
+    # Slots with the same key share a day and start time
+    slot_day_start: Tuple[int, ...]
+    # Slots with the same key share a day and time
+    slot_day_time: Tuple[int, ...]
+    slot_clashes: Tuple[FrozenSet[int], ...]
+    # Bitmask of the time cells a lecture slot covers, lecture slots overlap if their masks share
+    # a bit. 0 for tutorial slots
+    slot_5XX_cells: Tuple[int, ...]
+    lec_slots: Tuple[int, ...]
+    tut_slots: Tuple[int, ...]
+
+    # (item, slot) of every partial assignment in input order
+    part_assign: Tuple[Tuple[int, int], ...]
+
+    num_courses: int
+    num_day_starts: int
+    pen_lec_min: int
+    pen_tut_min: int
+    pen_not_paired: int
+    pen_section: int
+
+    @property
+    def num_items(self) -> int:
+        return len(self.items)
+
+
+def _day_overlap(slot1: LecTutSlot, slot2: LecTutSlot, is_lec1: bool, is_lec2: bool) -> bool:
+    """Returns True if the days of two slots overlap"""
+    if slot1.day == slot2.day:
+        return True
+
+    # Check if MWF lecture clashes with F tutorial
+    if is_lec1 and slot1.day == "MO" and not is_lec2 and slot2.day == "FR":
+        return True
+    if not is_lec1 and slot1.day == "FR" and is_lec2 and slot2.day == "MO":
+        return True
+
+    return False
+
+
+def _overlap(start1: float, end1: float, start2: float, end2: float) -> bool:
+    """Return True if two times overlap"""
+    return not ((end1 <= start2) or (end2 <= start1))
+
+
+def _lecture_cells(slots: List[LecTutSlot], slot_is_lec: List[bool]) -> List[int]:
+    """Splits every day of the lecture slots into cells between consecutive slot start and end
+    times and returns the bitmask of the cells each lecture slot covers"""
+    day_bounds: Dict[str, List[float]] = {}
+    for slot, lec in zip(slots, slot_is_lec):
+        if lec:
+            day_bounds.setdefault(slot.day, []).extend((slot.start_time, slot.end_time))
+
+    # Bit of the cell starting at each day and time
+    cell_bit: Dict[Tuple[str, float], int] = {}
+    num_bits = 0
+    for day, bounds in day_bounds.items():
+        for start in sorted(set(bounds))[:-1]:
+            cell_bit[(day, start)] = num_bits
+            num_bits += 1
+
+    cells = []
+    for slot, lec in zip(slots, slot_is_lec):
+        mask = 0
+        if lec:
+            for start in sorted(set(day_bounds[slot.day])):
+                if slot.start_time <= start < slot.end_time:
+                    mask |= 1 << cell_bit[(slot.day, start)]
+        cells.append(mask)
+    return cells
+
+
+def _add_851_913(
+    lectures: Dict[str, LecTut],
+    tutorials: Dict[str, LecTut],
+    input_data: InputData,
+) -> Tuple[Dict[str, PartialAssignment], List[Tuple[str, str]]]:
+    """Adds the 851 TUT and 913 TUT partial assignments to TU 18:00 if 351 or 413 exist. Returns
+    the partial assignments and not compatible pairs including the added ones"""
+    part_assign = dict(input_data.part_assign)
+    not_compatible = [(non_c.id1, non_c.id2) for non_c in input_data.not_compatible]
+
+    for lec in lectures.values():
+        for course_id, added_id in (
+            ("CPSC 351", "CPSC 851 TUT 01"),
+            ("CPSC 413", "CPSC 913 TUT 01"),
+        ):
+            if lec.course_id != course_id:
+                continue
+            tutorials[added_id] = Tutorial(added_id, False)
+            part_assign[added_id] = PartialAssignment(added_id, "TU", "18:00")
+            for lt in input_data.lectures + input_data.tutorials:
+                if lt.course_id == course_id:
+                    not_compatible.append((lt.identifier, added_id))
+
+    return part_assign, not_compatible
+
+
+def _find_symmetric_tutorials(
+    items: List[LecTut],
+    item_parent: List[int],
+    item_not_compatible: List[Set[int]],
+    item_pairs: List[List[int]],
+    item_unwanted: List[Set[int]],
+    item_prefs: List[List[Tuple[int, int]]],
+    part_assign: List[Tuple[int, int]],
+) -> List[List[int]]:
+    """Finds the classes of interchangeable tutorials: tutorials of the same lecture with the same
+    AL and evening requirements and no preferences, unwanted slots, pairs, not compatible entries
+    or partial assignments. Swapping the slots of two of them gives a schedule with the same eval
+    score that passes the same hard constraints"""
+    assigned = {item for item, _ in part_assign}
+    classes: Dict[Tuple[int, bool, bool], List[int]] = {}
+    for i, item in enumerate(items):
+        if (
+            is_tut(item)
+            and item_parent[i] >= 0
+            and not item_not_compatible[i]
+            and not item_pairs[i]
+            and not item_unwanted[i]
+            and not item_prefs[i]
+            and i not in assigned
+        ):
+            key = (item_parent[i], item.alrequired, item.is_evening)
+            classes.setdefault(key, []).append(i)
+    return [tuts for tuts in classes.values() if len(tuts) > 1]
+
+
+def compile_problem(input_data: InputData, shuffle: bool = False) -> Problem:
+    """Compiles the input data into its integer indexed form. With shuffle, lectures and tutorials
+    are numbered in random order instead of input order"""
+
+    input_lectures = list(input_data.lectures)
+    input_tutorials = list(input_data.tutorials)
+    if shuffle:
+        random.shuffle(input_tutorials)
+        random.shuffle(input_lectures)
+
+    lectures: Dict[str, LecTut] = {item.identifier: item for item in input_lectures}
+    tutorials: Dict[str, LecTut] = {item.identifier: item for item in input_tutorials}
+    part_assign, not_compatible = _add_851_913(lectures, tutorials, input_data)
+
+    items = list(lectures.values()) + list(tutorials.values())
+    item_index = {item.identifier: i for i, item in enumerate(items)}
+    course_index: Dict[str, int] = {}
+    for item in items:
+        course_index.setdefault(item.course_id, len(course_index))
+
+    item_parent: List[int] = []
+    item_children: List[List[int]] = [[] for _ in items]
+    for i, item in enumerate(items):
+        parent = -1
+        if is_tut(item) and item.parent_lecture_id in lectures:
+            parent = item_index[item.parent_lecture_id]
+            item_children[parent].append(i)
+        item_parent.append(parent)
+
+    item_not_compatible: List[Set[int]] = [set() for _ in items]
+    for id1, id2 in not_compatible:
+        if id1 in item_index and id2 in item_index:
+            item_not_compatible[item_index[id1]].add(item_index[id2])
+            item_not_compatible[item_index[id2]].add(item_index[id1])
+
+    # Pairs are only tracked between lectures / tutorials that exist in the schedule
+    item_pairs: List[List[int]] = [[] for _ in items]
+    for pair in input_data.pair:
+        if pair.id1 in item_index and pair.id2 in item_index:
+            item_pairs[item_index[pair.id1]].append(item_index[pair.id2])
+            item_pairs[item_index[pair.id2]].append(item_index[pair.id1])
+
+    # remove Tuesday @ 11-12:30 from slots
+    lec_slot_map = {
+        slot.identifier: slot
+        for slot in input_data.lec_slots
+        if not (slot.day == "TU" and slot.time == "11:00")
+    }
+    tut_slot_map = {slot.identifier: slot for slot in input_data.tut_slots}
+    slots: List[LecTutSlot] = list(lec_slot_map.values()) + list(tut_slot_map.values())
+    slot_is_lec = [True] * len(lec_slot_map) + [False] * len(tut_slot_map)
+
+    day_starts: Dict[Tuple[str, float], int] = {}
+    day_times: Dict[Tuple[str, str], int] = {}
+    for slot in slots:
+        day_starts.setdefault((slot.day, slot.start_time), len(day_starts))
+        day_times.setdefault((slot.day, slot.time), len(day_times))
+
+    slot_clashes: List[Set[int]] = [set() for _ in slots]
+    for j1, slot1 in enumerate(slots):
+        for j2, slot2 in enumerate(slots):
+            if _day_overlap(slot1, slot2, slot_is_lec[j1], slot_is_lec[j2]) and _overlap(
+                slot1.start_time, slot1.end_time, slot2.start_time, slot2.end_time
+            ):
+                slot_clashes[j1].add(j2)
+
+    item_unwanted: List[Set[int]] = [set() for _ in items]
+    for ident, unwanted in input_data.unwanted.items():
+        if ident not in item_index:
+            continue
+        i = item_index[ident]
+        for j, slot in enumerate(slots):
+            if any(
+                slot.day == uw.day and slot.start_time == uw.start_time
+                for uw in unwanted
+            ):
+                item_unwanted[i].add(j)
+
+    item_prefs: List[List[Tuple[int, int]]] = [[] for _ in items]
+    for ident, prefs in input_data.preferences.items():
+        if ident not in item_index:
+            continue
+        # Preferences for a day and time without a slot can never be met
+        item_prefs[item_index[ident]] = [
+            (day_starts.get((pref.day, pref.start_time), -1), pref.pref_val)
+            for pref in prefs
+        ]
+
+    slot_day_start = [day_starts[(slot.day, slot.start_time)] for slot in slots]
+    item_allowed: List[FrozenSet[int]] = []
+    item_pref_pen: List[Tuple[int, ...]] = []
+    for i, item in enumerate(items):
+        item_allowed.append(
+            frozenset(
+                j
+                for j, slot in enumerate(slots)
+                if slot_is_lec[j] == is_lec(item)
+                and j not in item_unwanted[i]
+                and not (item.is_evening and slot.start_time < EVENING_TIME)
+            )
+        )
+        # Every preference for another day and start time than the slot's is not met
+        met: Dict[int, int] = {}
+        for pref_day_start, pref_val in item_prefs[i]:
+            met[pref_day_start] = met.get(pref_day_start, 0) + pref_val
+        total = sum(pref_val for _, pref_val in item_prefs[i])
+        item_pref_pen.append(tuple(total - met.get(day_start, 0) for day_start in slot_day_start))
+
+    problem_part_assign: List[Tuple[int, int]] = []
+    for lt_id, p_assign in part_assign.items():
+        if lt_id not in item_index:
+            raise Exception(
+                f"The partial assignment for lecture / tutorial {lt_id} failed because it does not exist in the schedule."
+            )
+        i = item_index[lt_id]
+        for j, slot in enumerate(slots):
+            if (
+                slot_is_lec[j] == is_lec(items[i])
+                and slot.day == p_assign.day
+                and slot.time == p_assign.time
+            ):
+                problem_part_assign.append((i, j))
+                break
+        else:
+            raise Exception(
+                f"The slot for partial assignment {lt_id} {p_assign.day} {p_assign.time} does not exist."
+            )
+
+    item_symmetric_prev = [-1] * len(items)
+    item_symmetric_next = [-1] * len(items)
+    for tuts in _find_symmetric_tutorials(
+        items,
+        item_parent,
+        item_not_compatible,
+        item_pairs,
+        item_unwanted,
+        item_prefs,
+        problem_part_assign,
+    ):
+        for prev, nxt in zip(tuts, tuts[1:]):
+            item_symmetric_next[prev] = nxt
+            item_symmetric_prev[nxt] = prev
+
+    return Problem(
+        items=tuple(items),
+        item_is_lec=tuple(is_lec(item) for item in items),
+        item_level=tuple(item.level for item in items),
+        item_evening=tuple(item.is_evening for item in items),
+        item_alrequired=tuple(item.alrequired for item in items),
+        item_course=tuple(course_index[item.course_id] for item in items),
+        item_parent=tuple(item_parent),
+        item_children=tuple(tuple(children) for children in item_children),
+        item_not_compatible=tuple(tuple(sorted(nc)) for nc in item_not_compatible),
+        item_pairs=tuple(tuple(pairs) for pairs in item_pairs),
+        item_unwanted=tuple(frozenset(unwanted) for unwanted in item_unwanted),
+        item_prefs=tuple(tuple(prefs) for prefs in item_prefs),
+        item_allowed=tuple(item_allowed),
+        item_pref_pen=tuple(item_pref_pen),
+        item_slot_order=tuple(
+            tuple(sorted((pref_pen[j], j) for j in allowed))
+            for allowed, pref_pen in zip(item_allowed, item_pref_pen)
+        ),
+        item_symmetric_prev=tuple(item_symmetric_prev),
+        item_symmetric_next=tuple(item_symmetric_next),
+        slots=tuple(slots),
+        slot_is_lec=tuple(slot_is_lec),
+        slot_start=tuple(slot.start_time for slot in slots),
+        slot_max_cap=tuple(slot.max_cap for slot in slots),
+        slot_min_cap=tuple(slot.min_cap for slot in slots),
+        slot_alt_max=tuple(slot.alt_max for slot in slots),
+        slot_day_start=tuple(slot_day_start),
+        slot_day_time=tuple(day_times[(slot.day, slot.time)] for slot in slots),
+        slot_clashes=tuple(frozenset(clashes) for clashes in slot_clashes),
+        slot_5XX_cells=tuple(_lecture_cells(slots, slot_is_lec)),
+        lec_slots=tuple(j for j in range(len(slots)) if slot_is_lec[j]),
+        tut_slots=tuple(j for j in range(len(slots)) if not slot_is_lec[j]),
+        part_assign=tuple(problem_part_assign),
+        num_courses=len(course_index),
+        num_day_starts=len(day_starts),
+        pen_lec_min=input_data.pen_lec_min,
+        pen_tut_min=input_data.pen_tut_min,
+        pen_not_paired=input_data.pen_not_paired,
+        pen_section=input_data.pen_section,
+    )
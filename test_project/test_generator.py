@@ -0,0 +1,35 @@
+from dataclasses import replace
+
+from benchmarks.generator import InstanceSpec, generate_instance
+from benchmarks.run import run_benchmark
+from project.parser import get_input_data
+
+SPEC = InstanceSpec(
+    num_lectures=6, tutorials_per_lecture=2, num_lec_slots=5, num_tut_slots=8
+)
+
+
+def test_generated_instance_is_deterministic_and_parses():
+    lines = generate_instance(SPEC)
+    assert lines == generate_instance(SPEC)
+    assert lines != generate_instance(replace(SPEC, seed=1))
+
+    input_data = get_input_data(lines, "1", "1", "1", "1", "1", "1", "1", "1")
+    assert len(input_data.lectures) == 6
+    assert len(input_data.tutorials) == 12
+    assert len(input_data.lec_slots) == 5
+    assert len(input_data.tut_slots) == 8
+
+
+def test_run_benchmark_reports_timings():
+    spec = InstanceSpec(
+        num_lectures=4, tutorials_per_lecture=1, num_lec_slots=4, num_tut_slots=4
+    )
+    result = run_benchmark(spec, time_limit=60, search_options={})
+
+    assert result["num_nodes"] > 0
+    assert result["first_solution_seconds"] is not None
+    assert result["best_eval"] <= result["first_eval"]
+    # The optimal schedule is found before the search proves it optimal
+    assert result["optimal_seconds"] == result["solutions"][-1]["seconds"]
+    assert result["optimal_seconds"] <= result["proof_seconds"]
@@ -1,11 +1,20 @@
 
 
+import copy
+from concurrent.futures import ThreadPoolExecutor
+import multiprocessing
+import sys
 from pathlib import Path
 
 import pytest
 
+from benchmarks.generator import InstanceSpec, generate_instance
 from project.and_tree import AndTreeSearch
-from project.parser import get_input_data
+from project.batch import expand_weights, run_batch
+from project.cache import load_problem
+from project.parser import get_input_data, parse_schedule
+from project.portfolio import luby, portfolio_search
+from project.problem import EVENING_TIME, compile_problem
 
 TEST_DIR = Path(__file__).parent
 INPUTS_DIR = TEST_DIR / "inputs"
@@ -28,4 +37,539 @@ def test_input_files(input_path: Path):
     if "Eval-value" in expected:
         assert search.get_formatted_answer_with_eval() == expected
     else:
-        assert search.get_formatted_answer() == expected
\ No newline at end of file
+        assert search.get_formatted_answer() == expected
+
+@pytest.mark.parametrize("input_path", input_files, ids=lambda p: p.name)
+def test_parallel_search(input_path: Path):
+    expected_path = OUTPUTS_DIR / input_path.name
+
+    input_data = get_input_data(input_path, "1", "1", "1", "1", "1", "1", "1", "1")
+    search = AndTreeSearch(input_data)
+    search.search(workers=2)
+
+    expected = expected_path.read_text()
+
+    if "Eval-value" in expected:
+        assert search.get_formatted_answer_with_eval() == expected
+    else:
+        assert search.get_formatted_answer() == expected
+
+
+SEARCH_OPTIONS = {
+    "dynamic_order": {"dynamic_order": True},
+    "backjump": {"backjump": True, "nogood_size": 3},
+    "break_symmetry": {"break_symmetry": True},
+}
+
+
+@pytest.mark.parametrize("options", SEARCH_OPTIONS.values(), ids=SEARCH_OPTIONS.keys())
+@pytest.mark.parametrize("input_path", input_files, ids=lambda p: p.name)
+def test_search_options_find_same_schedule(input_path: Path, options: dict):
+    expected_path = OUTPUTS_DIR / input_path.name
+
+    input_data = get_input_data(input_path, "1", "1", "1", "1", "1", "1", "1", "1")
+    search = AndTreeSearch(input_data, **options)
+    search.search()
+
+    expected = expected_path.read_text()
+
+    if "Eval-value" in expected:
+        assert search.get_formatted_answer_with_eval() == expected
+    else:
+        assert search.get_formatted_answer() == expected
+
+
+def _tight_not_compatible_lines(num_fillers: int) -> list:
+    """Three mutually not compatible lectures and two lecture slots, with unconstrained lectures
+    ordered between the first one and the other two"""
+    lectures = (
+        ["CPSC 201 LEC 01"]
+        + [f"CPSC {300 + i} LEC 01" for i in range(num_fillers)]
+        + ["CPSC 401 LEC 01", "CPSC 402 LEC 01"]
+    )
+    return (
+        ["Name:", "tight", "", "Lecture slots:", "MO, 8:00, 20, 0, 20", "MO, 9:00, 20, 0, 20"]
+        + ["", "Tutorial slots:", "", "Lectures:"]
+        + [f"{lec}, false" for lec in lectures]
+        + ["", "Tutorials:", "", "Not compatible:"]
+        + ["CPSC 201 LEC 01, CPSC 401 LEC 01", "CPSC 201 LEC 01, CPSC 402 LEC 01"]
+        + ["CPSC 401 LEC 01, CPSC 402 LEC 01"]
+        + ["", "Unwanted:", "", "Preferences:", "", "Pair:", "", "Partial assignments:", ""]
+    )
+
+
+# Small generated instances with preferences, pairs and slots with a min fill
+BOUND_WEIGHTS = ["1", "1", "1", "1", "5", "5", "2", "2"]
+
+
+def _bound_instance(num_lectures: int):
+    spec = InstanceSpec(
+        num_lectures=num_lectures,
+        tutorials_per_lecture=1,
+        num_lec_slots=4,
+        num_tut_slots=4,
+        preference_density=1.0,
+        pair_density=0.2,
+    )
+    return get_input_data(generate_instance(spec), *BOUND_WEIGHTS)
+
+
+def test_lower_bound_is_admissible():
+    input_data = _bound_instance(4)
+    search = AndTreeSearch(input_data)
+
+    # Walks the whole tree (nothing is pruned without a schedule to beat) and returns the best
+    # eval score of the complete schedules below the current node
+    def best_below() -> float:
+        item = search._next_item()
+        if item is None:
+            return search._get_eval_score()
+        best = float("inf")
+        for expansion in list(search._get_expansions(item)):
+            lower_bound = search._get_lower_bound(*expansion)
+            search._pre_dfs_updates(*expansion)
+            ev = best_below()
+            search._post_dfs_updates()
+            assert lower_bound <= ev
+            best = min(best, ev)
+        return best
+
+    optimal = AndTreeSearch(input_data)
+    optimal.search()
+    assert best_below() == optimal.best_eval
+
+
+def test_lower_bound_prunes_more_than_schedule_so_far(monkeypatch: pytest.MonkeyPatch):
+    input_data = _bound_instance(5)
+    bound = AndTreeSearch(input_data)
+    bound.search()
+
+    # Only the penalties of the schedule so far, without the unassigned lectures / tutorials
+    monkeypatch.setattr(
+        AndTreeSearch,
+        "_get_lower_bound",
+        lambda self, item, slot, b_score: self._curr_bounding_score + b_score,
+    )
+    partial = AndTreeSearch(input_data)
+    partial.search()
+
+    assert bound.best_eval == partial.best_eval
+    assert bound.num_nodes * 10 < partial.num_nodes
+
+
+def test_dynamic_order_fails_tight_instance_early():
+    input_data = get_input_data(
+        _tight_not_compatible_lines(8), "1", "1", "1", "1", "1", "1", "1", "1"
+    )
+    plain = AndTreeSearch(input_data, break_limit=1)
+    plain.search()
+    dynamic = AndTreeSearch(input_data, break_limit=1, dynamic_order=True)
+    dynamic.search()
+
+    assert plain.ans is None and dynamic.ans is None
+    assert dynamic.num_nodes * 100 < plain.num_nodes
+
+
+def test_backjump_skips_unrelated_assignments():
+    input_data = get_input_data(
+        _tight_not_compatible_lines(8), "1", "1", "1", "1", "1", "1", "1", "1"
+    )
+    plain = AndTreeSearch(input_data, break_limit=1)
+    plain.search()
+    backjump = AndTreeSearch(input_data, break_limit=1, backjump=True)
+    backjump.search()
+    with_nogoods = AndTreeSearch(input_data, break_limit=1, backjump=True, nogood_size=3)
+    with_nogoods.search()
+
+    assert plain.ans is None and backjump.ans is None and with_nogoods.ans is None
+    assert backjump.num_nodes * 10 < plain.num_nodes
+    assert not backjump._nogoods
+    nogoods = [nogood for nogoods in with_nogoods._nogoods.values() for nogood in nogoods]
+    assert nogoods and all(len(nogood) <= 3 for nogood in nogoods)
+
+
+def test_break_symmetry_explores_one_order_of_labs():
+    num_labs = 5
+    lines = (
+        ["Name:", "labs", "", "Lecture slots:", "MO, 8:00, 5, 0, 5", "", "Tutorial slots:"]
+        + [f"TU, {hour}:00, 1, 0, 1" for hour in range(8, 9 + num_labs)]
+        + ["", "Lectures:", "CPSC 231 LEC 01, false", "", "Tutorials:"]
+        + [f"CPSC 231 LEC 01 TUT {lab:02}, false" for lab in range(1, num_labs + 1)]
+        + ["", "Not compatible:", "", "Unwanted:", "", "Preferences:", "", "Pair:"]
+        + ["", "Partial assignments:", ""]
+    )
+    input_data = get_input_data(lines, "1", "1", "1", "1", "1", "1", "1", "1")
+    plain = AndTreeSearch(input_data)
+    plain.search()
+    symmetric = AndTreeSearch(input_data, break_symmetry=True)
+    symmetric.search()
+
+    assert symmetric.best_eval == plain.best_eval
+    assert symmetric.num_nodes * 10 < plain.num_nodes
+
+
+@pytest.mark.parametrize("input_path", input_files, ids=lambda p: p.name)
+def test_portfolio_search(input_path: Path):
+    input_data = get_input_data(input_path, "1", "1", "1", "1", "1", "1", "1", "1")
+    serial = AndTreeSearch(input_data)
+    serial.search()
+
+    # Small node limits so the larger inputs go through several restarts
+    best = portfolio_search(input_data, 2, first_feasible=False, base_node_limit=4)
+    first = portfolio_search(input_data, 2, base_node_limit=4)
+
+    assert best.eval_score == serial.best_eval
+    assert (first.ans is None) == (serial.ans is None)
+    assert first.eval_score >= best.eval_score
+
+
+def test_luby_sequence():
+    assert [luby(i) for i in range(1, 16)] == [1, 1, 2, 1, 1, 2, 4, 1, 1, 2, 1, 1, 2, 4, 8]
+
+
+def test_expansions_come_in_bound_order():
+    lines = (
+        ["Name:", "sections", "", "Lecture slots:"]
+        + ["MO, 8:00, 3, 0, 3", "MO, 9:00, 3, 0, 3", "MO, 10:00, 3, 0, 3", "TU, 9:30, 3, 0, 3"]
+        + ["", "Tutorial slots:", "", "Lectures:"]
+        + ["CPSC 231 LEC 01, false", "CPSC 231 LEC 02, false", "CPSC 231 LEC 03, false"]
+        + ["", "Tutorials:", "", "Not compatible:", "", "Unwanted:", "", "Preferences:"]
+        + ["MO, 9:00, CPSC 231 LEC 02, 1", "TU, 9:30, CPSC 231 LEC 02, 2"]
+        + ["MO, 10:00, CPSC 231 LEC 03, 1"]
+        + ["", "Pair:", "", "Partial assignments:", ""]
+    )
+    search = AndTreeSearch(get_input_data(lines, "1", "1", "1", "1", "1", "1", "1", "1"))
+    problem = search._problem
+
+    # Every node of the tree, so later sections pay a section penalty in some of them
+    def check_node():
+        item = search._next_item()
+        if item is None:
+            return
+        eager = sorted(
+            (search._calc_bounding_score_contrib(item, slot), slot)
+            for slot in problem.lec_slots
+            if not search._fail_hc(item, slot)
+        )
+        expansions = list(search._get_expansions(item))
+        assert [(b_score, slot) for _, slot, b_score in expansions] == eager
+        for expansion in expansions:
+            search._pre_dfs_updates(*expansion)
+            check_node()
+            search._post_dfs_updates()
+
+    check_node()
+
+
+def test_expansions_are_checked_when_asked_for(monkeypatch: pytest.MonkeyPatch):
+    spec = InstanceSpec(
+        num_lectures=10, tutorials_per_lecture=1, num_lec_slots=12, num_tut_slots=12
+    )
+    input_data = get_input_data(generate_instance(spec), "1", "1", "1", "1", "1", "1", "1", "1")
+    search = AndTreeSearch(input_data)
+    checked = []
+    fail_hc = AndTreeSearch._fail_dynamic_hc
+    monkeypatch.setattr(
+        AndTreeSearch,
+        "_fail_dynamic_hc",
+        lambda self, item, slot: checked.append(slot) or fail_hc(self, item, slot),
+    )
+
+    expansions = search._get_expansions(search._next_item())
+    assert not checked
+    next(expansions)
+    assert 0 < len(checked) < 12
+
+
+@pytest.mark.parametrize("input_path", input_files, ids=lambda p: p.name)
+def test_static_slot_tables(input_path: Path):
+    input_data = get_input_data(input_path, "1", "1", "1", "1", "1", "1", "1", "1")
+    problem = compile_problem(input_data)
+
+    for item in range(problem.num_items):
+        for slot in range(len(problem.slots)):
+            allowed = (
+                problem.slot_is_lec[slot] == problem.item_is_lec[item]
+                and slot not in problem.item_unwanted[item]
+                and not (problem.item_evening[item] and problem.slot_start[slot] < EVENING_TIME)
+            )
+            assert (slot in problem.item_allowed[item]) == allowed
+            assert problem.item_pref_pen[item][slot] == sum(
+                pref_val
+                for pref_day_start, pref_val in problem.item_prefs[item]
+                if pref_day_start != problem.slot_day_start[slot]
+            )
+        assert problem.item_slot_order[item] == tuple(
+            sorted((problem.item_pref_pen[item][slot], slot) for slot in problem.item_allowed[item])
+        )
+
+    for slot1 in problem.lec_slots:
+        for slot2 in problem.lec_slots:
+            overlap = bool(problem.slot_5XX_cells[slot1] & problem.slot_5XX_cells[slot2])
+            assert overlap == (slot2 in problem.slot_clashes[slot1])
+
+
+def test_input_from_lines_matches_file():
+    input_path = INPUTS_DIR / "combo.txt"
+    from_path = get_input_data(input_path, "1", "1", "1", "1", "1", "1", "1", "1")
+    with open(input_path) as f:
+        from_stream = get_input_data(f, "1", "1", "1", "1", "1", "1", "1", "1")
+    from_lines = get_input_data(
+        input_path.read_text().splitlines(), "1", "1", "1", "1", "1", "1", "1", "1"
+    )
+
+    assert from_stream == from_path
+    assert from_lines == from_path
+
+
+def test_cached_problem_gives_same_schedule(tmp_path: Path):
+    input_path = INPUTS_DIR / "combo.txt"
+    weights = ["1"] * 8
+    content = input_path.read_bytes()
+
+    compiled = load_problem(content, weights, tmp_path)
+    assert len(list(tmp_path.glob("*.pickle"))) == 1
+    cached = load_problem(content, weights, tmp_path)
+    assert cached is not compiled
+    load_problem(content, ["2"] + weights[1:], tmp_path)
+    assert len(list(tmp_path.glob("*.pickle"))) == 2
+
+    search = AndTreeSearch(cached)
+    search.search()
+    assert search.get_formatted_answer_with_eval() == (
+        OUTPUTS_DIR / "combo.txt"
+    ).read_text()
+
+
+def test_batch_matches_single_solves():
+    input_paths = [str(INPUTS_DIR / "combo.txt"), str(INPUTS_DIR / "pref_assigned.txt")]
+    weight_grid = expand_weights(["1", "1,2", "1", "1", "1", "1", "1", "1"])
+    assert len(weight_grid) == 2
+
+    output = run_batch(input_paths, weight_grid, {}, processes=2)
+
+    assert set(output["parse_seconds"]) == set(input_paths)
+    assert len(output["results"]) == 4
+    for result in output["results"]:
+        search = AndTreeSearch(get_input_data(result["input_file"], *result["weights"]))
+        search.search()
+        assert result["eval"] == search.best_eval
+        assert result["schedule"] == search.get_formatted_answer()
+
+
+def test_warm_start_from_previous_schedule():
+    input_path = INPUTS_DIR / "combo.txt"
+    expected_path = OUTPUTS_DIR / "combo.txt"
+    cold = AndTreeSearch(get_input_data(input_path, "1", "1", "1", "1", "1", "1", "1", "1"))
+    cold.search()
+
+    prior = parse_schedule(expected_path)
+    warm = AndTreeSearch(
+        get_input_data(input_path, "1", "1", "1", "1", "1", "1", "1", "1"),
+        warm_start=prior,
+    )
+    # The previous schedule is the incumbent before the search starts
+    assert warm.get_formatted_answer_with_eval() == expected_path.read_text()
+    warm.search()
+
+    assert warm.get_formatted_answer_with_eval() == expected_path.read_text()
+    assert warm.num_nodes < cold.num_nodes
+
+    # Without a complete previous schedule it only guides the search
+    del prior["SENG 511 TUT 01"]
+    partial = AndTreeSearch(
+        get_input_data(input_path, "1", "1", "1", "1", "1", "1", "1", "1"),
+        warm_start=prior,
+    )
+    assert partial.ans is None
+    partial.search()
+    assert partial.get_formatted_answer_with_eval() == expected_path.read_text()
+
+
+@pytest.mark.parametrize("workers", [None, 2])
+def test_warm_start_is_first_feasible_schedule(workers):
+    input_data = get_input_data(
+        INPUTS_DIR / "combo.txt", "1", "1", "1", "1", "1", "1", "1", "1"
+    )
+    cold = AndTreeSearch(input_data, break_limit=1)
+    cold.search()
+    assert cold.ans is not None
+
+    warm = AndTreeSearch(
+        input_data,
+        break_limit=1,
+        warm_start={ident: (item.slot.day, item.slot.time) for ident, item in cold.ans.items()},
+    )
+    warm.search(workers=workers)
+
+    assert warm.get_formatted_answer_with_eval() == cold.get_formatted_answer_with_eval()
+    assert warm.num_nodes == 0
+
+
+def test_searches_share_one_problem():
+    input_data = get_input_data(
+        INPUTS_DIR / "combo.txt", "1", "1", "1", "1", "1", "1", "1", "1"
+    )
+    original = copy.deepcopy(input_data)
+    problem = compile_problem(input_data)
+    expected = (OUTPUTS_DIR / "combo.txt").read_text()
+
+    def solve(_):
+        search = AndTreeSearch(problem)
+        search.search()
+        return search.get_formatted_answer_with_eval()
+
+    with ThreadPoolExecutor(4) as pool:
+        assert list(pool.map(solve, range(8))) == [expected] * 8
+
+    # Searching from the input data directly leaves it unchanged as well
+    AndTreeSearch(input_data, shuffle=True).search()
+    assert input_data == original
+
+
+def test_anytime_search_reports_improving_schedules():
+    input_data = get_input_data(
+        INPUTS_DIR / "combo.txt", "1", "1", "1", "1", "1", "1", "1", "1"
+    )
+    evals = []
+    search = AndTreeSearch(
+        input_data, time_limit=60, on_solution=lambda ev, _: evals.append(ev)
+    )
+    search.search()
+
+    assert evals == sorted(evals, reverse=True)
+    assert len(set(evals)) == len(evals)
+    assert search.finished and search.best_eval == evals[-1]
+    assert search.get_formatted_answer_with_eval() == (
+        OUTPUTS_DIR / "combo.txt"
+    ).read_text()
+
+
+def test_improve_first_schedule():
+    input_data = get_input_data(
+        INPUTS_DIR / "combo.txt", "1", "1", "1", "1", "1", "1", "1", "1"
+    )
+    evals = []
+    search = AndTreeSearch(
+        input_data, break_limit=1, on_solution=lambda ev, _: evals.append(ev)
+    )
+    search.search()
+    search.improve(time_limit=60)
+
+    assert len(evals) > 1
+    assert evals == sorted(evals, reverse=True)
+    assert search.ans is not None
+    assert len(search.ans) == len(search._problem.items)
+
+
+# Seeds and sizes of generated instances where a later move puts a lecture / tutorial back in
+# the slot it was found in
+@pytest.mark.parametrize("seed, num_lectures", [(26, 3), (29, 4), (61, 6)])
+def test_improved_schedule_passes_hard_constraints(seed: int, num_lectures: int):
+    spec = InstanceSpec(
+        num_lectures=num_lectures,
+        tutorials_per_lecture=1,
+        num_lec_slots=4,
+        num_tut_slots=4,
+        preference_density=1.0,
+        pair_density=0.3,
+        seed=seed,
+    )
+    input_data = get_input_data(generate_instance(spec), "2", "3", "1", "2", "1", "2", "3", "1")
+    search = AndTreeSearch(input_data, break_limit=1)
+    search.search()
+    first_eval = search.best_eval
+    search.improve(time_limit=60)
+    assert search.ans is not None and search.best_eval < first_eval
+
+    # A warm start only keeps a schedule that passes the hard constraints, and computes its
+    # eval score from scratch
+    check = AndTreeSearch(
+        input_data,
+        warm_start={ident: (item.slot.day, item.slot.time) for ident, item in search.ans.items()},
+    )
+    assert check.ans is not None
+    assert check.best_eval == search.best_eval
+
+
+def test_parallel_search_with_spawned_workers(monkeypatch: pytest.MonkeyPatch):
+    # Spawned workers only get what can be pickled, unlike forked ones
+    spawn = multiprocessing.get_context("spawn")
+    monkeypatch.setattr(multiprocessing, "Pool", spawn.Pool)
+    monkeypatch.setattr(multiprocessing, "Value", spawn.Value)
+    input_path = INPUTS_DIR / "combo.txt"
+    evals = []
+    search = AndTreeSearch(
+        get_input_data(input_path, "1", "1", "1", "1", "1", "1", "1", "1"),
+        on_solution=lambda ev, _: evals.append(ev),
+        progress=lambda _: None,
+    )
+    search.search(workers=2)
+
+    assert search.get_formatted_answer_with_eval() == (OUTPUTS_DIR / "combo.txt").read_text()
+    assert evals and evals[-1] == search.best_eval
+
+
+def test_improve_schedule_from_parallel_search():
+    input_path = INPUTS_DIR / "combo.txt"
+    search = AndTreeSearch(
+        get_input_data(input_path, "1", "1", "1", "1", "1", "1", "1", "1"), break_limit=1
+    )
+    # The schedule is pickled back from a worker process
+    search.search(workers=2)
+    search.improve(time_limit=60)
+
+    assert search.ans is not None
+    assert len(search.ans) == len(search._problem.items)
+
+
+def test_node_limit_keeps_best_schedule_so_far():
+    input_data = get_input_data(
+        INPUTS_DIR / "combo.txt", "1", "1", "1", "1", "1", "1", "1", "1"
+    )
+    search = AndTreeSearch(input_data, node_limit=1)
+    search.search()
+
+    assert search.ans is None and not search.finished
+    assert search.get_formatted_answer() == "No valid schedule!"
+
+
+def test_search_deeper_than_recursion_limit(tmp_path: Path):
+    num_lectures = sys.getrecursionlimit() + 100
+    lectures = "\n".join(
+        f"SENG 200 LEC {section}, false"
+        for section in range(1000, 1000 + num_lectures)
+    )
+    input_path = tmp_path / "deep.txt"
+    input_path.write_text(
+        f"Name:\ndeep\n\nLecture slots:\nMO, 8:00, {num_lectures}, 0, 0\n\n"
+        f"Tutorial slots:\n\nLectures:\n{lectures}\n\nTutorials:\n\n"
+        "Not compatible:\n\nUnwanted:\n\nPreferences:\n\nPair:\n\nPartial assignments:\n"
+    )
+
+    input_data = get_input_data(input_path, "1", "1", "1", "1", "1", "1", "1", "1")
+    search = AndTreeSearch(input_data, break_limit=1)
+    search.search()
+
+    assert search.ans is not None
+    assert len(search.ans) == num_lectures
+
+
+def test_progress_callback_can_cancel_search():
+    input_data = get_input_data(
+        INPUTS_DIR / "combo.txt", "1", "1", "1", "1", "1", "1", "1", "1"
+    )
+    reports = []
+
+    def on_progress(progress):
+        reports.append(progress)
+        search.cancel()
+
+    search = AndTreeSearch(input_data, progress=on_progress, progress_interval=0)
+    search.search()
+
+    # One report from the first node and a final one when the search stops
+    assert len(reports) == 2
+    assert reports[0].num_nodes == 1
+    assert reports[-1].num_nodes == 1
+    assert search.ans is None